@@ -1,11 +1,50 @@
+import time
+_import_start = time.perf_counter()
+
 import os
 from flask import Flask, redirect, url_for, request
-from models import db
+from assets import init_assets
+from events import init_events
+from importer import register_cli
+from metrics import init_metrics
+from ratelimit import init_rate_limit
+from sessions import init_sessions
+from startup import StartupTimer, init_templates
 from views import bp as un_design_bp
 
+# このモジュール（と Flask・各機能のモジュール）の読み込みにかかった時間。
+# SQLAlchemy（models）は sql ストアのときだけ create_app() の中で読み込む
+IMPORT_SECONDS = time.perf_counter() - _import_start
+
 def create_app():
-    app = Flask(__name__)
-    
+    timer = StartupTimer()
+    timer.add('imports', IMPORT_SECONDS)
+    with timer.phase('config'):
+        app = _configure(Flask(__name__))
+
+    if app.config['UN_DESIGN_STORE'] == 'sql':
+        with timer.phase('database'):
+            from sql_store import init_database
+            init_database(app)
+    with timer.phase('events'):
+        init_events(app)
+    with timer.phase('sessions'):
+        init_sessions(app)
+    with timer.phase('extensions'):
+        init_metrics(app)
+        init_rate_limit(app)
+        init_assets(app)
+        register_cli(app)
+    with timer.phase('routes'):
+        _register_routes(app)
+    with timer.phase('templates'):
+        init_templates(app)
+
+    timer.publish(app)
+    return app
+
+def _configure(app):
+    """環境変数から設定を読み込む"""
     app.config['SECRET_KEY'] = 'un-design-secret'
     
     # 修正ポイント：環境変数 DATABASE_URL があれば使い、なければローカルの SQLite を使う
@@ -18,8 +57,52 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = db_url or 'sqlite:///pavilion.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-    db.init_app(app)
+    # データの保存先：memory（既定・単一ワーカー）または sql（DBに永続化・複数ワーカー対応）
+    app.config['UN_DESIGN_STORE'] = os.environ.get('UN_DESIGN_STORE', 'memory')
+    # 投票者IDとグループの名簿（JSON）。未設定なら roster.DEFAULT_COHORTS
+    app.config['UN_DESIGN_ROSTER'] = os.environ.get('UN_DESIGN_ROSTER')
+    # ログインのパスワード（イベントごとの設定がなければこれを使う）
+    app.config['UN_DESIGN_ADMIN_PASSWORD'] = os.environ.get('UN_DESIGN_ADMIN_PASSWORD', '930522')
+    app.config['UN_DESIGN_USER_PASSWORD'] = os.environ.get('UN_DESIGN_USER_PASSWORD', '2525land')
+
+    # 複数のクラス・行事（イベント）を1つのデプロイで運用する：イベント一覧の JSON（events.load_events）。
+    # 未設定なら従来の設定でイベントを1つだけ作る。使われていないイベントは UN_DESIGN_EVENT_IDLE 秒でメモリから退避する
+    app.config['UN_DESIGN_EVENTS'] = os.environ.get('UN_DESIGN_EVENTS')
+    app.config['UN_DESIGN_EVENT_IDLE'] = int(os.environ.get('UN_DESIGN_EVENT_IDLE', 30 * 60))
 
+    # memory ストアの永続化：変更ログとスナップショットの保存先（未設定なら再起動でリセット）。
+    # UN_DESIGN_EVENTS があればイベントごとに <UN_DESIGN_DATA_DIR>/<slug> に保存する
+    app.config['UN_DESIGN_DATA_DIR'] = os.environ.get('UN_DESIGN_DATA_DIR')
+    app.config['UN_DESIGN_WAL_FSYNC'] = os.environ.get('UN_DESIGN_WAL_FSYNC') == '1'
+    app.config['UN_DESIGN_SNAPSHOT_EVERY'] = int(os.environ.get('UN_DESIGN_SNAPSHOT_EVERY', 1000))
+
+    # セッションの保存先：sqlite（既定・再起動後もログインが続き、複数ワーカーで共有）/ cookie（署名付き Cookie）/
+    # memory（明示したときだけ。再起動で全員ログアウトになる）
+    app.config['UN_DESIGN_SESSION_BACKEND'] = os.environ.get('UN_DESIGN_SESSION_BACKEND', 'sqlite')
+    app.config['UN_DESIGN_SESSION_DB'] = os.environ.get('UN_DESIGN_SESSION_DB') or os.path.join(app.instance_path, 'sessions.db')
+    app.config['UN_DESIGN_SESSION_TTL'] = int(os.environ.get('UN_DESIGN_SESSION_TTL', 8 * 60 * 60))
+
+    # ログインの連続試行の制限（トークンバケット）：memory / sqlite（sql ストアの既定・複数ワーカーで共有）/ off
+    default_rate_limit = 'sqlite' if app.config['UN_DESIGN_STORE'] == 'sql' else 'memory'
+    app.config['UN_DESIGN_RATE_LIMIT_BACKEND'] = os.environ.get('UN_DESIGN_RATE_LIMIT_BACKEND', default_rate_limit)
+    app.config['UN_DESIGN_RATE_LIMIT_DB'] = os.environ.get('UN_DESIGN_RATE_LIMIT_DB') or os.path.join(app.instance_path, 'ratelimit.db')
+    # 1秒あたりの補充数と容量（IP 単位は学校のネットワークから全員がログインできる大きさにする）
+    app.config['UN_DESIGN_LOGIN_IP_RATE'] = float(os.environ.get('UN_DESIGN_LOGIN_IP_RATE', 5))
+    app.config['UN_DESIGN_LOGIN_IP_BURST'] = float(os.environ.get('UN_DESIGN_LOGIN_IP_BURST', 300))
+    app.config['UN_DESIGN_LOGIN_VOTER_RATE'] = float(os.environ.get('UN_DESIGN_LOGIN_VOTER_RATE', 0.1))
+    app.config['UN_DESIGN_LOGIN_VOTER_BURST'] = float(os.environ.get('UN_DESIGN_LOGIN_VOTER_BURST', 5))
+    # リバースプロキシ（Render は1段）の後ろなら、その段数分 X-Forwarded-For からクライアントの IP を読む
+    app.config['UN_DESIGN_PROXY_HOPS'] = int(os.environ.get('UN_DESIGN_PROXY_HOPS', 0))
+
+    # 起動の高速化：sql ストアの接続・スキーマ確認を最初のリクエストまで遅らせる（スリープからの復帰向け）
+    app.config['UN_DESIGN_LAZY_DB'] = os.environ.get('UN_DESIGN_LAZY_DB') == '1'
+    # Jinja のバイトコードキャッシュの保存先（`flask compile-templates` でビルド時に作成できる）
+    app.config['UN_DESIGN_JINJA_CACHE'] = os.environ.get('UN_DESIGN_JINJA_CACHE')
+    # 起動時に全テンプレートをコンパイルしておく（gunicorn --preload なら fork 前に1度だけ）
+    app.config['UN_DESIGN_WARM_TEMPLATES'] = os.environ.get('UN_DESIGN_WARM_TEMPLATES') == '1'
+    return app
+
+def _register_routes(app):
     # --- Blueprintの登録 ---
     app.register_blueprint(un_design_bp)
 
@@ -35,11 +118,6 @@ def create_app():
     def redirect_gate():
         return redirect(url_for('un_design.gate'), code=307)
 
-    with app.app_context():
-        db.create_all()
-
-    return app
-
 if __name__ == '__main__':
     app = create_app()
     
@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response, abort, request, url_for
+
+try:
+    import brotli
+except ImportError: # brotli は任意（未インストールなら gzip のみ）
+    brotli = None
+
+# テンプレートから切り出した CSS / JS の置き場所
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'un_design')
+
+# ファイル名に内容のハッシュを含めるため、ブラウザには1年間キャッシュさせる
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+class Asset:
+    """1ファイル分の内容と、事前に圧縮した版（encoding -> bytes）"""
+
+    def __init__(self, name, data):
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        self.fingerprinted = f"{stem}.{self.digest}{ext}"
+        self.mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.variants = {'identity': data}
+        compressed = gzip.compress(data, 9, mtime=0)
+        if len(compressed) < len(data):
+            self.variants['gzip'] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data):
+                self.variants['br'] = compressed
+
+class AssetBundle:
+    """静的ファイルのフィンガープリント付きの名前と圧縮済みの内容を保持する
+
+    初回参照時にまとめて作成する。auto_reload=True（デバッグ時）ならファイルの更新を検知して作り直す。
+    """
+
+    def __init__(self, directory=ASSET_DIR, auto_reload=False):
+        self.directory = directory
+        self.auto_reload = auto_reload
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._by_name = {}         # 元の名前 -> Asset
+        self._by_fingerprint = {}  # フィンガープリント付きの名前 -> Asset
+
+    def _current_stamp(self):
+        return tuple(sorted((entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(self.directory) if entry.is_file()))
+
+    def _ensure_built(self):
+        if self._stamp is not None and not self.auto_reload:
+            return
+        stamp = self._current_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            by_name = {}
+            for name, _ in stamp:
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    by_name[name] = Asset(name, f.read())
+            self._by_name = by_name
+            self._by_fingerprint = {asset.fingerprinted: asset for asset in by_name.values()}
+            self._stamp = stamp
+
+    def fingerprinted(self, name):
+        self._ensure_built()
+        return self._by_name[name].fingerprinted
+
+    def get(self, fingerprinted):
+        self._ensure_built()
+        return self._by_fingerprint.get(fingerprinted)
+
+def _choose_encoding(asset):
+    accepted = request.accept_encodings
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants and accepted[encoding]:
+            return encoding
+    return 'identity'
+
+def init_assets(app):
+    """/assets/<name> の配信と、テンプレート用の asset_url() を登録する"""
+    bundle = AssetBundle(auto_reload=app.debug)
+    app.extensions['un_design_assets'] = bundle
+
+    def serve_asset(filename):
+        asset = bundle.get(filename)
+        if asset is None:
+            abort(404)
+        encoding = _choose_encoding(asset)
+        response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f"{asset.digest}-{encoding}")
+        return response.make_conditional(request)
+
+    app.add_url_rule('/assets/<path:filename>', 'assets', serve_asset)
+    app.jinja_env.globals['asset_url'] = lambda name: url_for('assets', filename=bundle.fingerprinted(name))
+    return bundle
@@ -0,0 +1,79 @@
+import re
+
+from store import BALLOT_POINTS, voter_key
+
+FIELD_PREFIX = 'points_'
+# ASCII の整数だけを受け付ける（str.isdigit() は '²' なども真になり、int() で失敗する）
+INTEGER = re.compile(r'-?[0-9]+')
+
+class BallotResult:
+    """投票フォームの検証結果（allocations: proposal_id -> points、errors: エラーの dict のリスト）"""
+
+    def __init__(self):
+        self.allocations = {}
+        self.total = 0
+        self.errors = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def error(self, code, message, proposal_id=None):
+        self.errors.append({'code': code, 'message': message, 'proposal_id': proposal_id})
+
+    def as_dict(self):
+        return {'ok': self.ok, 'total': self.total, 'allocations': self.allocations, 'errors': self.errors}
+
+def _parse_points(value):
+    value = (value or '').strip()
+    if not value:
+        return 0
+    if INTEGER.fullmatch(value):
+        return int(value)
+    return None
+
+def validate_ballot(store, voter_id, group, form):
+    """投票フォームを、投票者のグループの企画だけを対象に検証する"""
+    result = BallotResult()
+    if not group:
+        result.error('no_group', 'グループが登録されていないため投票できません')
+        return result
+    if store.has_voted(voter_id):
+        result.error('already_voted', 'すでに投票済みです')
+        return result
+
+    proposals = {p.id: p for p in store.group_proposals(group)}
+    voter = voter_key(voter_id)
+    for name, value in form.items():
+        if not name.startswith(FIELD_PREFIX):
+            continue
+        pid = _parse_points(name[len(FIELD_PREFIX):])
+        points = _parse_points(value)
+        if points is None:
+            result.error('invalid_points', f'ポイントは整数で入力してください: {value}', pid)
+            continue
+        if points == 0:
+            continue
+        p = proposals.get(pid)
+        if p is None:
+            # 他のグループの企画、または削除済みの企画
+            result.error('unknown_proposal', '投票できない企画が含まれています', pid)
+        elif points < 0:
+            result.error('negative_points', 'ポイントは0以上で入力してください', pid)
+        elif voter_key(p.creator_id) == voter:
+            result.error('own_proposal', '自分の企画には投票できません', pid)
+        else:
+            result.allocations[pid] = points
+            result.total += points
+
+    if result.ok and result.total != BALLOT_POINTS:
+        result.error('total_mismatch', f'持ち点 {BALLOT_POINTS} PT をちょうど使い切ってください（現在 {result.total} PT）')
+    return result
+
+def cast_ballot(store, voter_id, group, form):
+    """検証して問題がなければ投票を確定する。BallotResult を返す"""
+    result = validate_ballot(store, voter_id, group, form)
+    if result.ok and store.submit_ballot(voter_id, result.allocations) is None:
+        # 検証後に他のリクエストが先に投票した、または企画が削除された
+        result.error('rejected', '投票を確定できませんでした。もう一度やり直してください')
+    return result
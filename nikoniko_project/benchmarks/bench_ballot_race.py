@@ -0,0 +1,159 @@
+"""同じ投票者による同時投票（二重送信）の負荷テスト
+
+使い方（nikoniko_project ディレクトリで実行）:
+
+    python benchmarks/bench_ballot_race.py                    # memory ストア、100人 × 同時8件
+    python benchmarks/bench_ballot_race.py --store sql --voters 150 --attempts 6
+
+投票者ごとに、持ち点をちょうど使い切る配分2種類と、持ち点を超える・足りない配分を
+同時に POST /un_design/vote_all へ送り、Flask テストクライアント経由で次を確認する。
+
+- 各投票者の投票は1件だけ確定し、成功の応答も1件だけ返る
+- 確定した投票は送った正しい配分のどちらかと一致し、合計は持ち点（1000）ちょうど
+- 持ち点を超える・足りない配分は確定しない
+- 負けた側の送信もエラー（5xx）ではなく通常の検証エラーとして返る
+- store.verify_tallies() が不一致を報告しない
+
+いずれかが成り立たなければ終了コード 1 で終わる。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+USER_PASSWORD = "2525land"
+BALLOT_POINTS = 1000
+# グループごとの企画数（各グループの名簿の先頭から作成者にする）
+PROPOSALS_PER_GROUP = 4
+
+def seed(app, roster):
+    """グループごとに企画を登録し、(グループ -> 企画IDのリスト, 投票者IDのリスト) を返す"""
+    from store import get_store
+    proposals = {}
+    voters = []
+    with app.app_context():
+        store = get_store()
+        for p in store.all_proposals():
+            store.delete_proposal(p)
+        for group in roster.groups:
+            members = roster.voter_ids(group)
+            creators, rest = members[:PROPOSALS_PER_GROUP], members[PROPOSALS_PER_GROUP:]
+            proposals[group] = [
+                store.add_proposal(str(vid), f'{group} 企画{vid}', 'bench', '生徒', 'p', 'd', 'e', 300, 300, 300, '情報通信業').id
+                for vid in creators
+            ]
+            voters.extend(rest)
+    return proposals, voters
+
+def variants(ids):
+    """(正しい配分のリスト, 正しくない配分のリスト) を返す"""
+    even = {pid: BALLOT_POINTS // len(ids) for pid in ids}
+    even[ids[0]] += BALLOT_POINTS - sum(even.values())
+    skewed = {ids[0]: BALLOT_POINTS - 100, ids[-1]: 100}
+    over = {ids[0]: BALLOT_POINTS, ids[1]: 1}
+    under = {ids[0]: BALLOT_POINTS - 1}
+    return [even, skewed], [over, under]
+
+def form(allocations):
+    return {f'points_{pid}': str(points) for pid, points in allocations.items()}
+
+def race(app, voter_id, group_ids, attempts):
+    """1人の投票者の投票を attempts 件同時に送り、(成功した配分のリスト, 正しい配分のリスト, 5xx の数) を返す"""
+    login = app.test_client()
+    login.post('/un_design/', data={'password': USER_PASSWORD, 'voter_id': str(voter_id)})
+    sid = login.get_cookie('session').value
+    valid, invalid = variants(group_ids)
+    plans = [(valid + invalid)[i % 4] for i in range(attempts)]
+    barrier = threading.Barrier(attempts)
+    accepted = []
+    server_errors = []
+
+    def submit(allocations):
+        client = app.test_client()
+        client.set_cookie('session', sid)
+        barrier.wait()
+        response = client.post('/un_design/vote_all', data=form(allocations), headers={'Accept': 'application/json'})
+        if response.status_code >= 500:
+            server_errors.append(response.status_code)
+        elif response.status_code == 200 and response.get_json()['ok']:
+            accepted.append(allocations)
+
+    threads = [threading.Thread(target=submit, args=(plan,)) for plan in plans]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return accepted, valid, len(server_errors)
+
+def check(app, roster, voters, outcomes):
+    from store import get_store
+    failures = []
+    with app.app_context():
+        store = get_store()
+        ballots = {str(b.voter_id): b for b in store.all_ballots()}
+        for voter_id, (accepted, valid, server_errors) in zip(voters, outcomes):
+            ballot = ballots.get(str(voter_id))
+            if server_errors:
+                failures.append(f'voter {voter_id}: {server_errors} submissions failed with 5xx')
+            if len(accepted) != 1:
+                failures.append(f'voter {voter_id}: {len(accepted)} submissions accepted')
+            if ballot is None:
+                failures.append(f'voter {voter_id}: no ballot recorded')
+                continue
+            allocations = dict(ballot.allocations)
+            if ballot.total_points != BALLOT_POINTS or sum(allocations.values()) != BALLOT_POINTS:
+                failures.append(f'voter {voter_id}: ballot totals {ballot.total_points} / {sum(allocations.values())}')
+            if allocations not in valid:
+                failures.append(f'voter {voter_id}: recorded allocations {allocations} were never a valid submission')
+        if len(ballots) != len(voters):
+            failures.append(f'{len(ballots)} ballots recorded for {len(voters)} voters')
+        mismatched = store.verify_tallies()
+        if mismatched:
+            failures.append(f'verify_tallies() reported {mismatched}')
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', choices=['memory', 'sql'], default='memory')
+    parser.add_argument('--voters', type=int, default=100)
+    parser.add_argument('--attempts', type=int, default=8, help='concurrent submissions per voter')
+    parser.add_argument('--concurrency', type=int, default=8, help='voters racing at the same time')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ.update(
+            UN_DESIGN_STORE=args.store,
+            UN_DESIGN_SESSION_DB=os.path.join(tmpdir, 'sessions.db'),
+            UN_DESIGN_RATE_LIMIT_BACKEND='off',
+        )
+        if args.store == 'sql':
+            os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'race.db')}"
+        from app_factory import create_app
+        app = create_app()
+        roster = app.extensions['un_design_roster']
+        proposals, voters = seed(app, roster)
+        voters = voters[:args.voters]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            outcomes = list(pool.map(lambda vid: race(app, vid, proposals[roster.group_of(vid)], args.attempts), voters))
+        elapsed = time.perf_counter() - start
+
+        failures = check(app, roster, voters, outcomes)
+        print(f"store={args.store}: {len(voters)} voters x {args.attempts} concurrent submissions "
+              f"({len(voters) * args.attempts} requests) in {elapsed:.2f}s")
+        if failures:
+            for failure in failures[:20]:
+                print('FAIL', failure)
+            print(f'{len(failures)} failures')
+            sys.exit(1)
+        print('OK: one ballot per voter, every ballot exactly 1000 points, tallies consistent')
+
+if __name__ == '__main__':
+    main()
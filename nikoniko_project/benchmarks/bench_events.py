@@ -0,0 +1,161 @@
+"""複数イベント（events.py）のベンチマーク
+
+使い方（nikoniko_project ディレクトリで実行）:
+
+    python benchmarks/bench_events.py                         # 20 イベント
+    python benchmarks/bench_events.py --events 50 --proposals 5000 --fsync
+
+1. 全イベントを1回ずつ使ったときの読み込み時間と、しばらく使われなかったイベントの退避・再読み込みの時間
+2. あるイベントに投票が集中している間の、別のイベントの読み取り（企画一覧の1ページ）のレイテンシ。
+   同じストアを共有した場合（イベント分割前）と比較する
+を表示する。--fsync を付けると投票ごとに変更ログを fsync する（ロックを保持する時間が長くなる）。
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+# 企画の作成者に使う名簿
+ROSTER = {'cohorts': [{'group': '1組', 'first': 100000, 'last': 199999}]}
+# 投票が集中するイベント。名簿は場面ごと・投票スレッドごとに別々の投票者を割り当てられる人数にする
+HOT_SLUG = 'event-2'
+FIRST_VOTER = 100000
+BURST_SCENARIOS = 2
+
+# 別のイベントの読み取りの間隔（秒）
+READ_INTERVAL = 0.001
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q / 100))]
+
+def hot_roster(voters):
+    return {'cohorts': [{'group': '1組', 'first': FIRST_VOTER, 'last': FIRST_VOTER + voters - 1}]}
+
+def write_events(tmpdir, count, hot_voters):
+    path = os.path.join(tmpdir, 'events.json')
+    events = [
+        {'slug': f'event-{i}', 'title': f'Event {i}', 'default': i == 0,
+         'roster': hot_roster(hot_voters) if f'event-{i}' == HOT_SLUG else ROSTER}
+        for i in range(count)
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'events': events}, f)
+    return path
+
+def bench_loading(app, registry, proposals):
+    client = app.test_client()
+    start = time.perf_counter()
+    for slug in registry.events:
+        client.get(f'/e/{slug}/un_design/').close()
+    first_touch = time.perf_counter() - start
+    print(f"{len(registry)} events touched in {first_touch * 1000:.0f} ms "
+          f"({first_touch / len(registry) * 1000:.1f} ms per event incl. load + gate render)")
+
+    event = registry.get('event-1')
+    with registry.using(event) as store:
+        for i in range(proposals):
+            store.add_proposal(str(100000 + i), f'企画{i}', 'bench', '生徒', 'p', 'd', 'e', 100, 100, 100, '情報通信業')
+
+    start = time.perf_counter()
+    evicted = registry.sweep(time.monotonic() + registry.idle_seconds + 1)
+    evict = time.perf_counter() - start
+    loaded = sum(1 for e in registry.events.values() if e.store is not None)
+    print(f"sweep evicted {evicted} idle events in {evict * 1000:.0f} ms ({loaded} still loaded: the default event is pinned)")
+
+    start = time.perf_counter()
+    with registry.using(event) as store:
+        count = len(store.all_proposals())
+    print(f"reload of an evicted event with {count} proposals: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+def bench_isolation(registry, seconds, writers, ops):
+    hot = registry.get(HOT_SLUG)
+    cold = registry.get('event-3')
+    print(f"\nreads on another event during a ballot burst ({writers} writer threads, {seconds:.1f}s each)")
+    print(f"{'scenario':<28} {'reads':>7} {'p50 us':>8} {'p99 us':>8} {'max ms':>8} {'ballots':>8}")
+    # どちらのイベントも同じ件数の企画を読む（イベントはサンプルの企画なしで始まる）
+    for event in (hot, cold):
+        with registry.using(event) as store:
+            for i in range(2):
+                store.add_proposal(str(FIRST_VOTER + i), f'企画{i}', 'bench', '生徒', 'p', 'd', 'e', 100, 100, 100, '情報通信業')
+    # 場面ごとに新しい投票者の範囲を使う（前の場面で投票済みの投票者を使い回さない）
+    next_first = FIRST_VOTER
+
+    for label, burst, shared in (('idle', False, False), ('burst, shared store (before)', True, True),
+                                 ('burst, separate events', True, False)):
+        with registry.using(hot) as hot_store, registry.using(cold) as cold_store:
+            read_store = hot_store if shared else cold_store
+            target = hot_store.all_proposals()[0].id
+            stop = threading.Event()
+            ballots = [0] * writers
+            errors = []
+
+            def vote(index, voter_ids):
+                try:
+                    for voter_id in voter_ids:
+                        if stop.is_set():
+                            return
+                        if hot_store.submit_ballot(str(voter_id), {target: 1000}) is None:
+                            raise RuntimeError(f'ballot of voter {voter_id} was rejected')
+                        ballots[index] += 1
+                    if not stop.is_set():
+                        raise RuntimeError(f'writer {index} ran out of voters after {len(voter_ids)} ballots (raise --ops)')
+                except Exception as e:
+                    errors.append(e)
+
+            threads = []
+            if burst:
+                for index in range(writers):
+                    first = next_first + index * ops
+                    threads.append(threading.Thread(target=vote, args=(index, range(first, first + ops))))
+                next_first += writers * ops
+            for t in threads:
+                t.start()
+            timings = []
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                read_store.page_proposals(limit=50)
+                timings.append(time.perf_counter() - start)
+                # 読み取りは一定間隔のリクエストとして発生させる（投票側のスループットを揃える）
+                time.sleep(READ_INTERVAL)
+            stop.set()
+            for t in threads:
+                t.join()
+        if errors:
+            # 途中で止まった投票スレッドがあると、集中していない時間の計測が混ざる
+            raise SystemExit(f'{label}: {len(errors)} writer(s) failed: {errors[0]}')
+        timings.sort()
+        print(f"{label:<28} {len(timings):>7} {percentile(timings, 50) * 1e6:>8.1f} {percentile(timings, 99) * 1e6:>8.1f} "
+              f"{timings[-1] * 1000:>8.2f} {sum(ballots):>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=20)
+    parser.add_argument('--proposals', type=int, default=2000, help='proposals in the event that is evicted and reloaded')
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--ops', type=int, default=100000, help='voters available to each writer thread per scenario')
+    parser.add_argument('--fsync', action='store_true', help='UN_DESIGN_WAL_FSYNC=1')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ.update(
+            UN_DESIGN_EVENTS=write_events(tmpdir, max(args.events, 4), BURST_SCENARIOS * args.writers * args.ops),
+            UN_DESIGN_DATA_DIR=os.path.join(tmpdir, 'data'),
+            UN_DESIGN_SESSION_DB=os.path.join(tmpdir, 'sessions.db'),
+            UN_DESIGN_WAL_FSYNC='1' if args.fsync else '0',
+        )
+        from app_factory import create_app
+        app = create_app()
+        registry = app.extensions['un_design_events']
+        bench_loading(app, registry, args.proposals)
+        bench_isolation(registry, args.seconds, args.writers, args.ops)
+
+if __name__ == '__main__':
+    main()
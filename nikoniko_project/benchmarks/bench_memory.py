@@ -0,0 +1,163 @@
+"""インメモリストアのメモリ使用量ベンチマーク（旧レイアウトと現在のレイアウトの比較）
+
+使い方（nikoniko_project ディレクトリで実行）:
+
+    python benchmarks/bench_memory.py                          # 10,000 企画 / 100,000 票
+    python benchmarks/bench_memory.py --proposals 2000 --votes 50000 --per-ballot 5
+
+旧レイアウト（__dict__ を持つクラス、企画ごとの文字列キーの votes dict、dict の配分）を
+このスクリプト内で再現し、MemoryStore が使うクラスを差し替えて同じデータを投入する。
+インデックス類は両者で共通なので、差はレコードの表現だけによる。計測には tracemalloc を使う。
+検索インデックス（search.SearchIndex）は比較から外し、同じ企画から作ったときの大きさを別に表示する。
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+import store
+from search import SearchIndex
+from store import MemoryStore, get_group_from_id, safe_int
+
+FIRST_VOTER_ID = 100000
+
+# --- 旧レイアウト（比較用） ---
+
+class LegacyProposal:
+    def __init__(self, id, title, author, target, problem, details, effect, c1, c2, c3, creator_id=None, category=None):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.target = target
+        self.problem = problem
+        self.details = details
+        self.effect = effect
+        self.cost_pt_1 = max(0, safe_int(c1))
+        self.cost_pt_2 = max(0, safe_int(c2))
+        self.cost_pt_3 = max(0, safe_int(c3))
+        self.votes = {} # str(user_id): points
+        self.creator_id = creator_id
+        self.group = get_group_from_id(creator_id)
+        self.category = category
+        self._total_points = 0
+        self._achievement_ratio = 0.0
+
+    @property
+    def author_group(self):
+        return self.group
+
+    def add_vote(self, user_id, points):
+        uid = str(user_id)
+        self.votes[uid] = points
+        if uid != str(self.creator_id):
+            self._total_points += points
+
+class LegacyBallot:
+    def __init__(self, voter_id, allocations, submitted_at=None):
+        self.voter_id = str(voter_id)
+        self.group = get_group_from_id(self.voter_id)
+        self.allocations = dict(allocations) # proposal_id: points
+        self.submitted_at = submitted_at if submitted_at is not None else time.time()
+        self.total_points = sum(self.allocations.values())
+
+class NullIndex:
+    """レコードの比較で検索インデックスを作らないための代わり"""
+
+    def add(self, p):
+        pass
+
+    def remove(self, proposal_id):
+        pass
+
+LAYOUTS = {
+    'legacy': (LegacyProposal, LegacyBallot),
+    'current': (store.Proposal, store.Ballot),
+}
+
+# --- データ生成 ---
+
+def make_dataset(n_proposals, n_votes, per_ballot, seed):
+    rng = random.Random(seed)
+    proposals = [
+        (i, f"企画{i}", f"作成者{i % 97}", "対象", f"課題{i}", f"詳細{i}", f"効果{i}",
+         rng.randint(0, 500), rng.randint(0, 500), rng.randint(0, 500), str(FIRST_VOTER_ID + i), f"カテゴリ{i % 12}")
+        for i in range(1, n_proposals + 1)
+    ]
+    # 1人 per_ballot 件に配分し、合計がちょうど持ち点（1000）になるようにする
+    ballots = []
+    base, rest = divmod(1000, per_ballot)
+    points = [base + (1 if k < rest else 0) for k in range(per_ballot)]
+    for n in range(n_votes // per_ballot):
+        pids = rng.sample(range(1, n_proposals + 1), per_ballot)
+        ballots.append((FIRST_VOTER_ID + n_proposals + n, dict(zip(pids, points))))
+    return proposals, ballots
+
+def measure(layout, proposals, ballots):
+    """指定したレイアウトのクラスで MemoryStore にデータを投入し、保持メモリ・ピーク・所要時間を返す"""
+    store.Proposal, store.Ballot = LAYOUTS[layout]
+    store.SearchIndex = NullIndex
+    try:
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        memory_store = MemoryStore()
+        memory_store._bump = lambda *groups: None # バージョン管理は計測対象外
+        for p in proposals:
+            memory_store.add_proposal(p[10], *p[1:10], category=p[11])
+        for voter_id, allocations in ballots:
+            memory_store.submit_ballot(str(voter_id), allocations)
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        store.Proposal, store.Ballot = LAYOUTS['current']
+        store.SearchIndex = SearchIndex
+    assert len(memory_store.voter_registry) == len(ballots)
+    return memory_store, current, peak, elapsed
+
+def measure_index(memory_store):
+    """ストアの企画から検索インデックスを作り、(保持メモリ, 所要時間) を返す"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = SearchIndex()
+    for p in memory_store.all_proposals():
+        index.add(p)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(index) == len(memory_store.all_proposals())
+    return current, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--proposals', type=int, default=10000)
+    parser.add_argument('--votes', type=int, default=100000, help='total (voter, proposal) allocations')
+    parser.add_argument('--per-ballot', type=int, default=10, help='allocations per voter')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    proposals, ballots = make_dataset(args.proposals, args.votes, args.per_ballot, args.seed)
+    print(f"{args.proposals} proposals, {len(ballots)} voters, {len(ballots) * args.per_ballot} votes")
+    print(f"{'layout':<10} {'retained MiB':>13} {'peak MiB':>10} {'build s':>9}")
+    results = {}
+    for name in LAYOUTS:
+        memory_store, current, peak, elapsed = measure(name, proposals, ballots)
+        results[name] = current
+        print(f"{name:<10} {current / 2**20:>13.1f} {peak / 2**20:>10.1f} {elapsed:>9.2f}")
+        if name == 'current':
+            index_bytes, index_seconds = measure_index(memory_store)
+        del memory_store
+    print(f"reduction: {1 - results['current'] / results['legacy']:.0%}")
+    print(f"search index (both layouts, not included above): {index_bytes / 2**20:.1f} MiB, built in {index_seconds:.2f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""メモリストアの永続化（変更ログ・スナップショット）のベンチマーク
+
+使い方（nikoniko_project ディレクトリで実行）:
+
+    python benchmarks/bench_persistence.py
+    python benchmarks/bench_persistence.py --proposals 10000 --voters 10000 --per-ballot 10
+
+1票あたりの submit_ballot の所要時間を、永続化なし・変更ログ（flush のみ）・変更ログ（毎回 fsync）で比較し、
+同じデータをスナップショットのみ・変更ログのみから復元する時間を計測する。
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from persistence import Journal
+from store import BALLOT_POINTS, MemoryStore
+
+FIRST_VOTER_ID = 100000
+
+def make_store(directory=None, fsync=False, snapshot_every=10**9):
+    store = MemoryStore()
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        journal = Journal(directory, fsync=fsync, snapshot_every=snapshot_every)
+        journal.write_snapshot(store.export_state())
+        store.journal = journal
+    return store
+
+def fill(store, n_proposals, n_voters, per_ballot, seed):
+    """企画と投票を投入し、投票1件ごとの所要時間（秒）のリストを返す"""
+    rng = random.Random(seed)
+    for i in range(n_proposals):
+        store.add_proposal(str(FIRST_VOTER_ID + i), f"企画{i}", "作成者", "対象", f"課題{i}", f"詳細{i}", f"効果{i}",
+                           rng.randint(0, 500), rng.randint(0, 500), rng.randint(0, 500), f"カテゴリ{i % 12}")
+    ids = [p.id for p in store.all_proposals()]
+    base, rest = divmod(BALLOT_POINTS, per_ballot)
+    points = [base + (1 if k < rest else 0) for k in range(per_ballot)]
+    timings = []
+    for n in range(n_voters):
+        allocations = dict(zip(rng.sample(ids, per_ballot), points))
+        start = time.perf_counter()
+        store.submit_ballot(str(FIRST_VOTER_ID + n_proposals + n), allocations)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def recover(directory):
+    store = MemoryStore()
+    journal = Journal(directory)
+    start = time.perf_counter()
+    journal.recover(store)
+    return store, journal, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--proposals', type=int, default=2000)
+    parser.add_argument('--voters', type=int, default=5000)
+    parser.add_argument('--per-ballot', type=int, default=10)
+    parser.add_argument('--fsync-voters', type=int, default=500, help='ballots to time with fsync (slow on real disks)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='un_design_persist_')
+    try:
+        print(f"{args.proposals} proposals, {args.voters} voters x {args.per_ballot} allocations")
+        print(f"{'mode':<14} {'ballots':>8} {'mean us':>9} {'p95 us':>9}")
+        cases = [
+            ('memory', None, False, args.voters),
+            ('wal', os.path.join(workdir, 'wal'), False, args.voters),
+            ('wal+fsync', os.path.join(workdir, 'fsync'), True, args.fsync_voters),
+        ]
+        for name, directory, fsync, voters in cases:
+            store = make_store(directory, fsync)
+            timings = sorted(fill(store, args.proposals, voters, args.per_ballot, args.seed))
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{name:<14} {voters:>8} {statistics.mean(timings) * 1e6:>9.1f} {p95 * 1e6:>9.1f}")
+            if store.journal is not None:
+                store.journal.close()
+
+        # 復元時間：変更ログのみ（上の wal の結果）と、同じ内容をスナップショットにまとめた場合
+        wal_dir = os.path.join(workdir, 'wal')
+        wal_bytes = os.path.getsize(os.path.join(wal_dir, 'wal.jsonl'))
+        store, journal, wal_seconds = recover(wal_dir)
+        journal.write_snapshot(store.export_state())
+        journal.close()
+        snapshot_bytes = os.path.getsize(os.path.join(wal_dir, 'snapshot.json'))
+        restored, _, snapshot_seconds = recover(wal_dir)
+        assert restored.verify_tallies() == [] and len(restored.voter_registry) == args.voters
+        # 集計値を壊すと検算で見つかり、repair=True で直る
+        broken = restored.all_proposals()[0]
+        broken._total_points += 1
+        assert restored.verify_tallies() == [broken.id]
+        assert restored.verify_tallies(repair=True) == [broken.id] and restored.verify_tallies() == []
+        print(f"recovery from log only: {wal_seconds * 1000:8.1f} ms ({wal_bytes / 2**20:.1f} MiB)")
+        print(f"recovery from snapshot: {snapshot_seconds * 1000:8.1f} ms ({snapshot_bytes / 2**20:.1f} MiB)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
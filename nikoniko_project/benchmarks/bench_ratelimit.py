@@ -0,0 +1,63 @@
+"""ログインの流量制限（ratelimit）のベンチマーク
+
+使い方（nikoniko_project ディレクトリで実行）:
+
+    python benchmarks/bench_ratelimit.py
+    python benchmarks/bench_ratelimit.py --checks 100000 --keys 50000
+
+1. バックエンド（memory / sqlite）ごとの allow() 1回あたりの時間と、キー数が上限を超えたときの保持数
+2. Flask テストクライアントで、制限された POST（429）と通常のログイン失敗（ゲート画面の描画）の
+   1リクエストあたりの時間
+を表示する。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from ratelimit import MAX_KEYS, MemoryRateLimiter, SQLiteRateLimiter
+
+def bench_backend(name, backend, checks, keys):
+    start = time.perf_counter()
+    for i in range(checks):
+        backend.allow(f'ip:10.0.{i % keys // 256}.{i % 256}', 5.0, 300)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<8} allow() {elapsed / checks * 1e6:8.1f} us  ({keys} keys -> {len(backend)} kept)")
+
+def bench_requests(requests):
+    from app_factory import create_app
+    app = create_app()
+    client = app.test_client()
+    form = {'password': 'wrong', 'voter_id': ''}
+    timings = {}
+    for label, address in (('rendered', lambda i: f'10.1.{i // 256}.{i % 256}'), ('429', lambda i: '10.0.0.1')):
+        if label == '429':
+            # 先にバケットを空にしておく
+            while client.post('/un_design/', data=form, environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code != 429:
+                pass
+        start = time.perf_counter()
+        for i in range(requests):
+            client.post('/un_design/', data=form, environ_base={'REMOTE_ADDR': address(i)})
+        timings[label] = (time.perf_counter() - start) / requests
+    print(f"\nrequest (test client): login failure rendered {timings['rendered'] * 1e6:.0f} us, "
+          f"throttled 429 {timings['429'] * 1e6:.0f} us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checks', type=int, default=50000)
+    parser.add_argument('--keys', type=int, default=MAX_KEYS * 2)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.environ.setdefault('UN_DESIGN_SESSION_DB', os.path.join(tmpdir, 'sessions.db'))
+        bench_backend('memory', MemoryRateLimiter(), args.checks, args.keys)
+        bench_backend('sqlite', SQLiteRateLimiter(os.path.join(tmpdir, 'ratelimit.db')), args.checks, args.keys)
+        bench_requests(args.requests)
+
+if __name__ == '__main__':
+    main()
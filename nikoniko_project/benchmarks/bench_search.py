@@ -0,0 +1,92 @@
+"""企画の全文検索（search.SearchIndex）のベンチマーク
+
+使い方（nikoniko_project ディレクトリで実行）:
+
+    python benchmarks/bench_search.py                      # 30,000 企画
+    python benchmarks/bench_search.py --proposals 50000 --queries 2000
+
+合成した日本語の企画をインデックスに登録し、登録時間・1件あたりの更新時間・
+検索語の種類ごとの検索レイテンシ（p50 / p95 / p99）を表示する。cold は結果キャッシュを
+毎回破棄した場合、warm は同じ検索語が繰り返された場合。
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from search import SearchIndex
+
+WORDS = [
+    '階段', '公園', '家電', '手入れ', '愛着', '運動不足', '達成感', '不便', '便利', '学校', '通学', '宿題',
+    '辞書', '手書き', '地図', '迷子', '待ち時間', '行列', '会話', '自販機', '電車', '自転車', '坂道', '読書',
+    '料理', '掃除', '洗濯', '農業', '商店街', '図書館', '病院', '体力', '健康', '記憶', '集中', '工夫',
+    'スマホ', 'アプリ', 'センサー', 'ロボット', 'エレベーター', 'キャッシュレス', 'AI', 'ネット',
+]
+CATEGORIES = ['建設・不動産業', '製造業（軽工業）', '情報通信業', '教育・学習支援業', '医療・福祉', '運輸業']
+
+class Proposal:
+    def __init__(self, id, rng):
+        self.id = id
+        self.title = ''.join(rng.sample(WORDS, 2)) + 'しかない' + rng.choice(WORDS)
+        self.category = rng.choice(CATEGORIES)
+        self.problem = 'が'.join(rng.sample(WORDS, 4)) + 'で困っている'
+        self.details = 'を'.join(rng.sample(WORDS, 6)) + 'にする'
+        self.effect = 'と'.join(rng.sample(WORDS, 3)) + 'が生まれる'
+        self.author_group = f"{id % 4 + 1}組"
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--proposals', type=int, default=30000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    proposals = [Proposal(i, rng) for i in range(1, args.proposals + 1)]
+    index = SearchIndex()
+    start = time.perf_counter()
+    for p in proposals:
+        index.add(p)
+    build = time.perf_counter() - start
+
+    # 差分更新（編集の再登録）
+    start = time.perf_counter()
+    for p in rng.sample(proposals, 1000):
+        index.add(p)
+    update = (time.perf_counter() - start) / 1000
+
+    kinds = {
+        'word': lambda: rng.choice(WORDS),
+        'two words': lambda: ' '.join(rng.sample(WORDS, 2)),
+        'category': lambda: rng.choice(CATEGORIES)[:2],
+        'one char': lambda: rng.choice(rng.choice(WORDS)),
+        'no match': lambda: '存在しない語句',
+    }
+    print(f"{args.proposals} proposals indexed in {build:.2f}s, update {update * 1e6:.0f}us/proposal")
+    print(f"{'query':<12} {'group':<6} {'cache':<6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, make_query in kinds.items():
+        for group in (None, '1組'):
+            for cache in ('cold', 'warm'):
+                timings = []
+                for _ in range(args.queries):
+                    query = make_query()
+                    if cache == 'cold':
+                        index._results.clear()
+                    else:
+                        index.search(query, group)
+                    start = time.perf_counter()
+                    index.search(query, group)
+                    timings.append(time.perf_counter() - start)
+                timings.sort()
+                print(f"{name:<12} {group or 'all':<6} {cache:<6} {percentile(timings, 50) * 1000:>8.3f} "
+                      f"{percentile(timings, 95) * 1000:>8.3f} {percentile(timings, 99) * 1000:>8.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""起動から最初のレスポンスまでの時間（コールドスタート）のベンチマーク
+
+使い方（nikoniko_project ディレクトリで実行）:
+
+    python benchmarks/bench_startup.py                          # run.py と gunicorn を各5回
+    python benchmarks/bench_startup.py --server gunicorn --repeat 10
+    python benchmarks/bench_startup.py --store sql --lazy-db    # DB の接続・スキーマ確認を遅らせる
+    python benchmarks/bench_startup.py --jinja-cache            # テンプレートのバイトコードキャッシュを使う
+
+サーバーのプロセスを起動してから GET /un_design/ が 200 を返すまでの時間を計測し、
+管理者でログインして /admin/metrics の un_design_startup_seconds（create_app() の段階ごとの
+所要時間と最初のリクエストの処理時間）を読み取って中央値を表示する。
+"""
+import argparse
+import http.cookiejar
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ADMIN_PASSWORD = "930522"
+# create_app() の処理順（表示用）
+PHASE_ORDER = ['imports', 'config', 'database', 'events', 'sessions', 'extensions', 'routes', 'templates', 'first_request']
+STARTUP_METRIC = re.compile(r'^un_design_startup_seconds\{phase="([^"]+)"\} (\S+)$', re.M)
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def server_command(server, port):
+    if server == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '-w', '1', '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'run:app']
+    return [sys.executable, 'run.py']
+
+def wait_first_response(proc, url, timeout=60):
+    """最初に 200 が返るまで問い合わせ続け、返った時刻を返す"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                response.read()
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.005)
+    raise RuntimeError('server did not respond in time')
+
+def startup_phases(base_url):
+    """管理者でログインし、計測値から起動の内訳（秒）を読む"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    login = urllib.parse.urlencode({'password': ADMIN_PASSWORD, 'voter_id': ''}).encode()
+    opener.open(base_url + '/un_design/', data=login, timeout=10).read()
+    with opener.open(base_url + '/un_design/admin/metrics', timeout=10) as response:
+        text = response.read().decode('utf-8')
+    return {phase: float(value) for phase, value in STARTUP_METRIC.findall(text)}
+
+def boot_once(server, env):
+    port = _free_port()
+    env = dict(env, PORT=str(port))
+    start = time.perf_counter()
+    proc = subprocess.Popen(server_command(server, port), cwd=PROJECT_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        ready = wait_first_response(proc, base_url + '/un_design/')
+        return ready - start, startup_phases(base_url)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=['run', 'gunicorn', 'both'], default='both')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--store', choices=['memory', 'sql'], default='memory')
+    parser.add_argument('--lazy-db', action='store_true', help='UN_DESIGN_LAZY_DB=1（sql ストアのみ有効）')
+    parser.add_argument('--jinja-cache', action='store_true', help='事前にコンパイルしたバイトコードキャッシュを使う')
+    parser.add_argument('--warm-templates', action='store_true', help='UN_DESIGN_WARM_TEMPLATES=1')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # RENDER を設定して run.py のデバッグモード（リローダー）を無効にする
+        env = dict(os.environ, RENDER='1', UN_DESIGN_STORE=args.store)
+        env.setdefault('UN_DESIGN_SESSION_DB', os.path.join(tmpdir, 'sessions.db'))
+        env.setdefault('UN_DESIGN_RATE_LIMIT_DB', os.path.join(tmpdir, 'ratelimit.db'))
+        if args.store == 'sql' and 'DATABASE_URL' not in os.environ:
+            env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        if args.lazy_db:
+            env['UN_DESIGN_LAZY_DB'] = '1'
+        if args.warm_templates:
+            env['UN_DESIGN_WARM_TEMPLATES'] = '1'
+        if args.jinja_cache:
+            env['UN_DESIGN_JINJA_CACHE'] = os.path.join(tmpdir, 'jinja')
+            subprocess.run([sys.executable, '-m', 'flask', '--app', 'run', 'compile-templates'],
+                           cwd=PROJECT_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+
+        servers = ['run', 'gunicorn'] if args.server == 'both' else [args.server]
+        options = [name for name, enabled in (('lazy-db', args.lazy_db), ('jinja-cache', args.jinja_cache),
+                                              ('warm-templates', args.warm_templates)) if enabled]
+        print(f"store={args.store} {' '.join(options) or 'defaults'}, {args.repeat} boots per server")
+        for server in servers:
+            totals = []
+            phases = {}
+            for _ in range(args.repeat):
+                seconds, breakdown = boot_once(server, env)
+                totals.append(seconds)
+                for phase, value in breakdown.items():
+                    phases.setdefault(phase, []).append(value)
+            totals.sort()
+            print(f"\n{server}: time to first response p50 {statistics.median(totals) * 1000:.0f} ms "
+                  f"(min {totals[0] * 1000:.0f}, max {totals[-1] * 1000:.0f})")
+            for phase in sorted(phases, key=lambda name: PHASE_ORDER.index(name) if name in PHASE_ORDER else len(PHASE_ORDER)):
+                print(f"  {phase:<16}{statistics.median(phases[phase]) * 1000:>9.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+"""投票フロー（gate → index → vote_all → result）の負荷テスト・マイクロベンチマーク
+
+使い方（nikoniko_project ディレクトリで実行）:
+
+    python benchmarks/bench_voting.py                        # Flask テストクライアント（プロセス内）
+    python benchmarks/bench_voting.py --students 200 --concurrency 50
+    python benchmarks/bench_voting.py --gunicorn --workers 2 --threads 8
+
+--gunicorn を指定するとローカルに gunicorn を起動し、HTTP 経由で計測する。
+このとき企画の投入も HTTP 経由で行う（--store sql なら一時 SQLite を使う）。
+ルートごとの p50 / p95 / p99 レイテンシとスループットを表示する。
+"""
+import argparse
+import contextlib
+import csv
+import http.cookiejar
+import io
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from roster import DEFAULT_COHORTS, Roster
+
+USER_PASSWORD = "2525land"
+ADMIN_PASSWORD = "930522"
+# gate() が受け付ける ID（サーバーと同じ名簿を使う）
+ROSTER = Roster.from_file(os.environ['UN_DESIGN_ROSTER']) if os.environ.get('UN_DESIGN_ROSTER') else Roster(DEFAULT_COHORTS)
+VOTER_IDS = ROSTER.voter_ids()
+BALLOT_POINTS = 1000
+
+# --- 計測結果 ---
+
+class Recorder:
+    """ルートごとのレイテンシ（秒）を記録する"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok=True):
+        with self._lock:
+            self.samples[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def report(recorder, elapsed, out=sys.stdout):
+    print(f"\n{'route':<14}{'count':>8}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}", file=out)
+    total = 0
+    for route in ROUTE_ORDER:
+        values = sorted(recorder.samples.get(route, []))
+        if not values:
+            continue
+        total += len(values)
+        print(
+            f"{route:<14}{len(values):>8}{recorder.errors[route]:>6}"
+            f"{percentile(values, 50) * 1000:>10.2f}{percentile(values, 95) * 1000:>10.2f}{percentile(values, 99) * 1000:>10.2f}"
+            f"{len(values) / elapsed:>10.1f}",
+            file=out,
+        )
+    print(f"\ntotal {total} requests in {elapsed:.2f}s ({total / elapsed:.1f} req/s)", file=out)
+
+ROUTE_ORDER = ['gate', 'index', 'vote_all', 'result', 'result(304)']
+
+# --- 合成データ ---
+
+def synthetic_voters(count, seed):
+    rng = random.Random(seed)
+    ids = list(VOTER_IDS)
+    rng.shuffle(ids)
+    return [str(v) for v in ids[:count]]
+
+def synthetic_proposals(count, seed):
+    """(creator_id, title, costs) を count 件作る"""
+    rng = random.Random(seed)
+    creators = VOTER_IDS
+    rows = []
+    for i in range(count):
+        creator = str(rng.choice(creators))
+        costs = [rng.randint(0, 500) for _ in range(3)]
+        rows.append((creator, f"合成企画 {i}", costs))
+    return rows
+
+def proposal_form(title, costs):
+    return {
+        'title': title, 'author': 'bench', 'target': '生徒', 'category': '情報通信業',
+        'problem': '便利すぎる' * 10, 'details': 'あえて不便にする' * 20, 'effect': '愛着が生まれる' * 10,
+        'cost_pt_1': costs[0], 'cost_pt_2': costs[1], 'cost_pt_3': costs[2],
+    }
+
+def ballot_form(voter_id, proposals, rng):
+    """自分のグループの、自分以外の企画に 1000pt を配分したフォームを作る（候補がなければ空）"""
+    group = ROSTER.group_of(voter_id)
+    candidates = [pid for pid, creator in proposals if creator != voter_id and ROSTER.group_of(creator) == group]
+    if not candidates:
+        return {}
+    picks = rng.sample(candidates, min(len(candidates), rng.randint(1, 5)))
+    cuts = sorted(rng.sample(range(1, BALLOT_POINTS), len(picks) - 1))
+    shares = [b - a for a, b in zip([0] + cuts, cuts + [BALLOT_POINTS])]
+    return {f'points_{pid}': str(pt) for pid, pt in zip(picks, shares)}
+
+# --- Flask テストクライアント ---
+
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, headers=None):
+        response = self.client.open(path, method=method, data=data, headers=headers or {})
+        response.close()
+        return response.status_code, response.headers.get('ETag')
+
+# --- HTTP（gunicorn） ---
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HTTPSession:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect
+        )
+
+    def request(self, method, path, data=None, headers=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers or {})
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                response.read()
+                return response.status, response.headers.get('ETag')
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get('ETag')
+
+    def fetch(self, path):
+        with self.opener.open(self.base_url + path, timeout=30) as response:
+            return response.read().decode('utf-8')
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+@contextlib.contextmanager
+def gunicorn_server(workers, threads, env):
+    port = _free_port()
+    cmd = [
+        sys.executable, '-m', 'gunicorn', '-w', str(workers), '-k', 'gthread', '--threads', str(threads),
+        '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'run:app',
+    ]
+    proc = subprocess.Popen(cmd, cwd=PROJECT_DIR, env=env, stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            with contextlib.suppress(OSError), socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                break
+            if proc.poll() is not None:
+                raise RuntimeError('gunicorn exited during startup')
+            time.sleep(0.1)
+        else:
+            raise RuntimeError('gunicorn did not start in time')
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+# --- シナリオ ---
+
+def login(session, voter_id, recorder):
+    t0 = time.perf_counter()
+    status, _ = session.request('POST', '/un_design/', {'password': USER_PASSWORD, 'voter_id': voter_id})
+    recorder.record('gate', time.perf_counter() - t0, status in (200, 302))
+
+def student_flow(make_session, voter_id, proposals, recorder, seed):
+    """1人の生徒がログインして一覧を見て投票し、結果画面を2回見る"""
+    rng = random.Random(seed)
+    session = make_session()
+    login(session, voter_id, recorder)
+
+    t0 = time.perf_counter()
+    status, _ = session.request('GET', '/un_design/index')
+    recorder.record('index', time.perf_counter() - t0, status == 200)
+
+    t0 = time.perf_counter()
+    status, _ = session.request('POST', '/un_design/vote_all', ballot_form(voter_id, proposals, rng))
+    recorder.record('vote_all', time.perf_counter() - t0, status in (200, 302))
+
+    t0 = time.perf_counter()
+    status, etag = session.request('GET', '/un_design/result')
+    recorder.record('result', time.perf_counter() - t0, status == 200)
+
+    # 再読み込み（ETag による再検証）
+    if etag:
+        t0 = time.perf_counter()
+        status, _ = session.request('GET', '/un_design/result', headers={'If-None-Match': etag})
+        recorder.record('result(304)', time.perf_counter() - t0, status in (200, 304))
+
+def seed_over_http(make_session, proposals):
+    """企画を作成者としてログインして HTTP 経由で登録し、(id, creator_id) の一覧を返す"""
+    recorder = Recorder()
+    for creator, title, costs in proposals:
+        session = make_session()
+        login(session, creator, recorder)
+        session.request('POST', '/un_design/add', proposal_form(title, costs))
+    # 採番された ID は管理者用の CSV エクスポートから取得する
+    admin = make_session()
+    admin.request('POST', '/un_design/', {'password': ADMIN_PASSWORD, 'voter_id': ''})
+    rows = csv.DictReader(io.StringIO(admin.fetch('/un_design/export_csv/proposals')))
+    return [(int(row['ID']), row['Creator_ID']) for row in rows]
+
+def run(args):
+    proposals = synthetic_proposals(args.proposals, args.seed)
+    voters = synthetic_voters(args.students, args.seed + 1)
+    recorder = Recorder()
+    env = dict(os.environ, UN_DESIGN_STORE=args.store)
+    tmpdir = tempfile.TemporaryDirectory()
+    if args.store == 'sql' and 'DATABASE_URL' not in os.environ:
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    env.setdefault('UN_DESIGN_SESSION_DB', os.path.join(tmpdir.name, 'sessions.db'))
+    # 全員が 127.0.0.1 からログインし、企画の投入では同じ作成者が何度もログインするため、
+    # ログインの流量制限は止めておく（制限自体のコストは bench_ratelimit.py で計測する）
+    env.setdefault('UN_DESIGN_RATE_LIMIT_BACKEND', 'off')
+
+    with contextlib.ExitStack() as stack:
+        stack.callback(tmpdir.cleanup)
+        if args.gunicorn:
+            base_url = stack.enter_context(gunicorn_server(args.workers, args.threads, env))
+            make_session = lambda: HTTPSession(base_url)
+            seeded = seed_over_http(make_session, proposals)
+        else:
+            os.environ.update(env)
+            from app_factory import create_app
+            from store import get_store
+            app = create_app()
+            # gate() のデバッグ出力を抑制する
+            stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+            with app.app_context():
+                store = get_store()
+                # サンプルデータを除いた合成データだけで計測する
+                for p in store.all_proposals():
+                    store.delete_proposal(p)
+                seeded = []
+                for creator, title, costs in proposals:
+                    p = store.add_proposal(creator, title, 'bench', '生徒', 'p', 'd', 'e', *costs, '情報通信業')
+                    seeded.append((p.id, creator))
+            make_session = lambda: TestClientSession(app)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [
+                pool.submit(student_flow, make_session, voter_id, seeded, recorder, args.seed + n)
+                for n, voter_id in enumerate(voters)
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+    mode = f"gunicorn x{args.workers} (threads={args.threads})" if args.gunicorn else "test client"
+    print(f"mode={mode} store={args.store} proposals={args.proposals} students={args.students} concurrency={args.concurrency}", file=sys.stderr)
+    report(recorder, elapsed)
+    return recorder
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--proposals', type=int, default=200, help='合成する企画数')
+    parser.add_argument('--students', type=int, default=200, help=f'投票する生徒数（最大は名簿の人数 {len(VOTER_IDS)}）')
+    parser.add_argument('--concurrency', type=int, default=20, help='同時に操作する生徒数')
+    parser.add_argument('--store', choices=['memory', 'sql'], default='memory')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--gunicorn', action='store_true', help='ローカルの gunicorn に HTTP で接続して計測する')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--max-p95-ms', type=float, default=None, help='いずれかのルートの p95 がこれを超えたら終了コード 1 を返す（回帰検出用）')
+    args = parser.parse_args(argv)
+    if args.gunicorn and args.store == 'memory' and args.workers > 1:
+        parser.error('memory store はワーカー間でデータを共有できません（--store sql を指定してください）')
+    args.students = min(args.students, len(VOTER_IDS))
+    recorder = run(args)
+    if args.max_p95_ms is not None:
+        slow = [
+            route for route, values in recorder.samples.items()
+            if percentile(sorted(values), 95) * 1000 > args.max_p95_ms
+        ]
+        errors = sum(recorder.errors.values())
+        if slow or errors:
+            print(f"FAILED: p95 over {args.max_p95_ms}ms: {', '.join(slow) or '-'} / errors: {errors}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
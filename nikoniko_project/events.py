@@ -0,0 +1,298 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app, has_request_context, request, session
+from werkzeug.exceptions import NotFound
+from werkzeug.wsgi import ClosingIterator
+
+import metrics
+from roster import Roster, init_roster, use_roster
+from sessions import COOKIE_ENVIRON
+from store import create_store
+
+# URL の接頭辞でイベントを選ぶ（/e/<slug>/un_design/...）
+PREFIX = '/e/'
+SLUG_PATTERN = re.compile(r'[a-z0-9][a-z0-9_-]{0,63}')
+# UN_DESIGN_EVENTS がないときの唯一のイベント
+DEFAULT_SLUG = 'default'
+
+# この秒数使われていないイベントのストアを保存先に書き出してメモリから捨てる（0 なら捨てない）
+IDLE_SECONDS = 30 * 60
+# 退避の確認はリクエストの終わりに、この秒数に1回だけ行う
+SWEEP_EVERY = 60
+
+EVENT_ENVIRON = 'un_design.event'
+_HOST_PORT = re.compile(r':\d+$')
+
+# リクエストの外（CLI など）で EventRegistry.using() 中のイベント
+_current = ContextVar('un_design_event', default=None)
+
+class Event:
+    """1つのクラス・行事。名簿・パスワード・ストア（企画・投票とそのキャッシュ）を他のイベントと共有しない"""
+
+    def __init__(self, slug, roster, admin_password, user_password, title=None, host=None, data_dir=None, cookie_name=None,
+                 samples=False):
+        self.slug = slug
+        self.roster = roster
+        self.admin_password = admin_password
+        self.user_password = user_password
+        self.title = title or ''
+        self.host = host.lower() if host else None
+        self.data_dir = data_dir
+        self.cookie_name = cookie_name # None なら SESSION_COOKIE_NAME のまま
+        self.samples = samples # データがないときにサンプルの企画を登録するか
+        self.store = None # 最初に使われたときに読み込み、退避したら None に戻す
+        self.active = 0 # 処理中のリクエスト（ライブ更新のストリームを含む）の数
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock() # ストアの読み込み・退避と active の増減
+
+    def __repr__(self):
+        return f'<Event {self.slug}>'
+
+class EventRegistry:
+    """イベントの一覧と、ストアの読み込み・退避を管理する
+
+    イベントごとに別々のストア（ロック・変更ログ・キャッシュ）を持つため、
+    あるイベントの投票の集中が他のイベントのロック待ちや走査を増やさない。
+    """
+
+    def __init__(self, app, events, default, idle_seconds=IDLE_SECONDS):
+        self.app = app
+        self.events = {e.slug: e for e in events}
+        self.default = default
+        self.idle_seconds = idle_seconds
+        self._hosts = {e.host: e for e in events if e.host}
+        self._last_sweep = time.monotonic()
+        self._sweep_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.events)
+
+    def get(self, slug):
+        return self.events.get(slug)
+
+    def route(self, environ):
+        """(イベント, URL の接頭辞) を返す。接頭辞のイベントがなければイベントは None"""
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(PREFIX):
+            slug = path[len(PREFIX):].split('/', 1)[0]
+            return self.events.get(slug), PREFIX + slug
+        host = _HOST_PORT.sub('', environ.get('HTTP_HOST', '').lower())
+        return self._hosts.get(host, self.default), ''
+
+    def current(self):
+        """現在のリクエストのイベント（リクエストの外では using() 中のイベントか既定のイベント）"""
+        if has_request_context():
+            event = request.environ.get(EVENT_ENVIRON)
+            if event is not None:
+                return event
+        return _current.get() or self.default
+
+    def session_slug(self, data):
+        """セッションがどのイベントでログインしたものか（記録のない古いセッションは既定のイベント）"""
+        return data.get('event') or self.default.slug
+
+    # --- 読み込みと退避 ---
+
+    def acquire(self, event):
+        """イベントのストアを（未読み込みなら読み込んで）使用中にする"""
+        with event.lock:
+            if event.store is None:
+                self._load(event)
+            event.active += 1
+            return event.store
+
+    def release(self, event):
+        with event.lock:
+            event.active -= 1
+            event.last_used = now = time.monotonic()
+        if now - self._last_sweep >= SWEEP_EVERY:
+            self.sweep(now)
+
+    @contextmanager
+    def using(self, event):
+        """with の中ではリクエストの外でも event の名簿・ストアを使う（CLI 用）"""
+        store = self.acquire(event)
+        token = _current.set(event)
+        try:
+            with use_roster(event.roster):
+                yield store
+        finally:
+            _current.reset(token)
+            self.release(event)
+
+    def _load(self, event):
+        # event.lock 内で呼ぶ
+        start = time.perf_counter()
+        with use_roster(event.roster):
+            event.store = create_store(self.app, event.data_dir, seed=event.samples)
+        seconds = time.perf_counter() - start
+        metrics.inc('un_design_event_loads_total', event=event.slug)
+        metrics.registry.observe('un_design_event_load_seconds', seconds)
+        self._publish_loaded()
+        self.app.logger.info("Loaded event %s in %.1f ms", event.slug, seconds * 1000)
+
+    def sweep(self, now=None):
+        """しばらく使われていないイベントのストアを保存先に書き出してメモリから捨てる。捨てた数を返す"""
+        if not self.idle_seconds or not self._sweep_lock.acquire(blocking=False):
+            return 0
+        try:
+            now = time.monotonic() if now is None else now
+            self._last_sweep = now
+            evicted = 0
+            for event in self.events.values():
+                if event.store is None or event.active:
+                    continue
+                with event.lock:
+                    # 保存先のないストアは捨てると復元できないので残す
+                    if event.store is None or event.active or now - event.last_used < self.idle_seconds or not event.store.persistent:
+                        continue
+                    event.store.close()
+                    event.store = None
+                evicted += 1
+                metrics.inc('un_design_event_evictions_total', event=event.slug)
+                self.app.logger.info("Evicted idle event %s", event.slug)
+            if evicted:
+                self._publish_loaded()
+            return evicted
+        finally:
+            self._sweep_lock.release()
+
+    def _publish_loaded(self):
+        loaded = sum(1 for e in self.events.values() if e.store is not None)
+        metrics.registry.set('un_design_events_loaded', loaded)
+
+class EventDispatcher:
+    """URL の接頭辞（/e/<slug>）か Host ヘッダーでイベントを選び、その名簿・ストアでリクエストを処理する WSGI ミドルウェア
+
+    接頭辞は SCRIPT_NAME に移すので、url_for() はイベントの URL をそのまま作る。
+    """
+
+    def __init__(self, wsgi_app, registry):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+
+    def __call__(self, environ, start_response):
+        event, prefix = self.registry.route(environ)
+        if event is None:
+            return NotFound()(environ, start_response)
+        if prefix:
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + prefix
+            environ['PATH_INFO'] = environ['PATH_INFO'][len(prefix):]
+        environ[EVENT_ENVIRON] = event
+        if event.cookie_name:
+            environ[COOKIE_ENVIRON] = event.cookie_name
+
+        released = False
+
+        def release():
+            # close() が2回呼ばれても1回だけ数える
+            nonlocal released
+            if not released:
+                released = True
+                self.registry.release(event)
+
+        self.registry.acquire(event)
+        try:
+            with use_roster(event.roster):
+                response = self.wsgi_app(environ, start_response)
+        except BaseException:
+            release()
+            raise
+        # ストリーミング応答を送り終えるまで使用中のままにする
+        return ClosingIterator(response, release)
+
+def load_events(app):
+    """設定からイベントの一覧を作り、(イベントのリスト, 既定のイベント) を返す
+
+    UN_DESIGN_EVENTS がなければ、従来の設定（UN_DESIGN_ROSTER・UN_DESIGN_DATA_DIR・パスワード）で
+    イベントを1つだけ作る。JSON ファイルの形式:
+
+        {"events": [{"slug": "2026-1", "title": "...", "host": "a.example.com",
+                     "admin_password": "...", "user_password": "...",
+                     "roster": "rosters/2026-1.json", "default": true}, ...]}
+
+    roster はファイルのパス（events ファイルからの相対パス）か {"cohorts": [...], "names": {...}}。
+    省略した項目は従来の設定を使う。データは UN_DESIGN_DATA_DIR/<slug> に保存する。
+    """
+    passwords = (app.config['UN_DESIGN_ADMIN_PASSWORD'], app.config['UN_DESIGN_USER_PASSWORD'])
+    data_dir = app.config.get('UN_DESIGN_DATA_DIR')
+    base_roster = init_roster(app)
+    path = app.config.get('UN_DESIGN_EVENTS')
+    if not path:
+        # サンプルの企画は従来の1イベント構成にだけ登録する（UN_DESIGN_EVENTS のイベントは空で始める）
+        event = Event(DEFAULT_SLUG, base_roster, *passwords, data_dir=data_dir, samples=True)
+        return [event], event
+
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+    events = []
+    default = None
+    for item in config['events']:
+        slug = item['slug']
+        if not SLUG_PATTERN.fullmatch(slug):
+            raise ValueError(f'invalid event slug: {slug!r}')
+        if any(e.slug == slug for e in events):
+            raise ValueError(f'duplicate event slug: {slug!r}')
+        roster = item.get('roster')
+        if roster is None:
+            roster = base_roster
+        elif isinstance(roster, str):
+            roster = Roster.from_file(os.path.join(base_dir, roster))
+        else:
+            roster = Roster(roster['cohorts'], roster.get('names'))
+        event = Event(
+            slug, roster,
+            item.get('admin_password', passwords[0]), item.get('user_password', passwords[1]),
+            title=item.get('title'), host=item.get('host'),
+            data_dir=os.path.join(data_dir, slug) if data_dir else None,
+        )
+        if item.get('default') and default is None:
+            default = event
+        events.append(event)
+    if not events:
+        raise ValueError(f'no events in {path}')
+    default = default or events[0]
+    # 同じブラウザで複数のイベントにログインできるよう、既定以外のイベントは Cookie を分ける
+    for event in events:
+        if event is not default:
+            event.cookie_name = f'{cookie_name}_{event.slug}'
+    return events, default
+
+def current_event():
+    return current_app.extensions['un_design_events'].current()
+
+def init_events(app):
+    """イベントの一覧を読み込み、リクエストをイベントごとに振り分ける
+
+    既定のイベントは起動時に読み込み、退避しない。それ以外は最初のリクエストで読み込む。
+    """
+    events, default = load_events(app)
+    if app.config.get('UN_DESIGN_STORE') == 'sql' and len(events) > 1:
+        # sql ストアのテーブルはイベントで分かれていない
+        raise ValueError('UN_DESIGN_EVENTS with several events requires the memory store')
+    init_roster(app, default.roster)
+
+    registry = EventRegistry(app, events, default, app.config.get('UN_DESIGN_EVENT_IDLE', IDLE_SECONDS))
+    registry.acquire(default)
+    app.extensions['un_design_events'] = registry
+    app.wsgi_app = EventDispatcher(app.wsgi_app, registry)
+
+    @app.before_request
+    def _check_session_event():
+        # 他のイベントでログインしたセッション（Cookie 名を書き換えたものなど）は使わせない
+        if session and registry.session_slug(session) != registry.current().slug:
+            session.clear()
+
+    @app.context_processor
+    def _inject_event():
+        return {'current_event': registry.current()}
+
+    return registry
@@ -0,0 +1,82 @@
+import csv
+import io
+import zlib
+from collections import defaultdict
+
+# 1回に送り出すチャンクの目安サイズ（文字数）
+CHUNK_SIZE = 64 * 1024
+
+PROPOSAL_HEADER = ['ID', 'Title', 'Author', 'Target', 'Category', 'Problem', 'Details', 'Effect', 'Cost_Dev', 'Cost_Ops', 'Cost_Health', 'Total_Points', 'Creator_ID']
+
+# --- エクスポート対象ごとの行ジェネレータ ---
+
+def proposal_rows(store):
+    yield PROPOSAL_HEADER
+    for p in store.iter_proposals():
+        yield [
+            p.id, p.title, p.author, p.target, p.category,
+            p.problem, p.details, p.effect,
+            p.cost_pt_1, p.cost_pt_2, p.cost_pt_3,
+            p.total_points, p.creator_id
+        ]
+
+def report_rows(store):
+    yield ['ID', 'Type', 'Env', 'Details', 'Status']
+    for r in store.iter_reports():
+        yield [r.id, r.report_type, r.env_value, r.details, r.status]
+
+def ballot_rows(store):
+    # 投票者ごとの配分（1配分1行）
+    yield ['Voter_ID', 'Group', 'Proposal_ID', 'Points', 'Submitted_At']
+    for b in store.iter_ballots():
+        for proposal_id, points in sorted(b.allocations.items()):
+            yield [b.voter_id, b.group, proposal_id, points, b.submitted_at]
+
+def group_rows(store):
+    # グループごとの集計（投稿数・達成数・獲得ポイント・投票者数・投票ポイント）
+    summary = defaultdict(lambda: {'proposals': 0, 'achieved': 0, 'received': 0, 'voters': 0, 'voted': 0})
+    for p in store.iter_proposals():
+        row = summary[p.author_group]
+        row['proposals'] += 1
+        row['received'] += p.total_points
+        if p.has_achieved:
+            row['achieved'] += 1
+    for b in store.iter_ballots():
+        row = summary[b.group]
+        row['voters'] += 1
+        row['voted'] += b.total_points
+    yield ['Group', 'Proposals', 'Achieved', 'Points_Received', 'Voters', 'Points_Voted']
+    for group in sorted(summary, key=lambda g: (g is None, g or '')):
+        row = summary[group]
+        yield [group or '', row['proposals'], row['achieved'], row['received'], row['voters'], row['voted']]
+
+EXPORTS = {
+    'proposals': proposal_rows,
+    'reports': report_rows,
+    'ballots': ballot_rows,
+    'groups': group_rows,
+}
+
+# --- ストリーミング ---
+
+def iter_csv(rows, chunk_size=CHUNK_SIZE):
+    """行をCSVに変換し、一定サイズごとに文字列チャンクとして返す（メモリ使用量は一定）"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= chunk_size:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue()
+
+def iter_gzip(chunks, level=6):
+    """文字列チャンクを gzip 形式で逐次圧縮する"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
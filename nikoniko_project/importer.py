@@ -0,0 +1,245 @@
+import csv
+import io
+import json
+import re
+
+import click
+
+from exports import PROPOSAL_HEADER
+from roster import active_roster
+
+# 1回のロック取得・コミットでまとめて登録する件数
+BATCH_SIZE = 500
+# JSON の配列を読み進める単位（文字数）
+JSON_CHUNK_SIZE = 64 * 1024
+# JSON の配列の1要素の上限（文字数）。これより長い要素は構文エラーとして扱う
+MAX_RECORD_SIZE = 1024 * 1024
+
+# エクスポートCSVの列名 -> add_proposal の引数名（ID と Total_Points は取り込まない）
+COLUMNS = {
+    'Title': 'title',
+    'Author': 'author',
+    'Target': 'target',
+    'Category': 'category',
+    'Problem': 'problem',
+    'Details': 'details',
+    'Effect': 'effect',
+    'Cost_Dev': 'c1',
+    'Cost_Ops': 'c2',
+    'Cost_Health': 'c3',
+    'Creator_ID': 'creator_id',
+}
+COST_COLUMNS = ('Cost_Dev', 'Cost_Ops', 'Cost_Health')
+# str.isdigit() は '²' なども通してしまうため、ASCII の数字だけを許す
+NON_NEGATIVE_INTEGER = re.compile(r'[0-9]+')
+
+class ImportResult:
+    """取り込み結果の集計"""
+
+    def __init__(self):
+        self.created = 0
+        self.duplicates = 0
+        self.errors = [] # (行番号, メッセージ)
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'errors': [{'line': line, 'message': message} for line, message in self.errors],
+        }
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def parse_row(record):
+    """1件分の dict（エクスポートCSVと同じ列名）を検証し、(企画の dict, エラー) を返す"""
+    row = {name: _text(record.get(column)) for column, name in COLUMNS.items()}
+    if not row['title']:
+        return None, 'Title is required'
+    if not row['creator_id']:
+        return None, 'Creator_ID is required'
+    if active_roster().group_of(row['creator_id']) is None:
+        return None, f"Creator_ID is not in the roster: {row['creator_id']}"
+    for column in COST_COLUMNS:
+        value = row[COLUMNS[column]] or '0'
+        if not NON_NEGATIVE_INTEGER.fullmatch(value):
+            return None, f'{column} must be a non-negative integer: {value}'
+        row[COLUMNS[column]] = int(value)
+    return row, None
+
+def iter_records(stream, fmt='csv'):
+    """アップロードされたバイト列のストリームから (行番号, dict, エラー) を1件ずつ返す
+
+    JSON Lines の構文エラーはその行のエラーとして返し、次の行から続ける。
+    JSON の配列は要素ごとに読み（ファイル全体をメモリに載せない）、途中の構文エラーは
+    その要素のエラーとして返してそこで終わる（以降の要素は区切りが分からないため読めない）。
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        missing = [c for c in ('Title', 'Creator_ID') if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"missing columns: {', '.join(missing)} (expected {','.join(PROPOSAL_HEADER)})")
+        for record in reader:
+            yield reader.line_num, record, None
+    elif fmt == 'jsonl':
+        for line_num, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_num, None, f'invalid JSON: {e.msg} (column {e.colno})'
+                continue
+            yield line_num, record, None
+    elif fmt == 'json':
+        yield from _iter_json_array(text)
+    else:
+        raise ValueError(f'unknown format: {fmt}')
+
+def _iter_json_array(text, chunk_size=JSON_CHUNK_SIZE):
+    """JSON の配列を要素ごとに読み、(要素の番号, 要素, エラー) を返す"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = text.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def peek():
+        # 空白を読み飛ばして次の文字を返す（終わりなら ''）
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not read_more():
+                return ''
+
+    if peek() != '[':
+        # まだ何も取り込んでいないので、ファイル全体のエラーにする
+        raise ValueError('JSON file must be an array of objects')
+    pos += 1
+    if peek() == ']':
+        return
+    index = 0
+    while True:
+        index += 1
+        if not peek():
+            yield index, None, 'invalid JSON: unexpected end of file'
+            return
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof or len(buffer) - pos > MAX_RECORD_SIZE:
+                    yield index, None, f'invalid JSON: {e.msg}'
+                    return
+                read_more()
+                continue
+            # 数値などは途中で切れていても読めてしまうので、後ろに続きがあるか確かめてから確定する
+            if end == len(buffer) and not eof:
+                read_more()
+                continue
+            break
+        pos = end
+        yield index, record, None
+        separator = peek()
+        if separator == ']':
+            pos += 1
+            if peek():
+                yield index + 1, None, 'invalid JSON: extra data after the array'
+            return
+        if separator != ',':
+            yield index + 1, None, "invalid JSON: expected ',' or ']'"
+            return
+        pos += 1
+
+def import_proposals(store, stream, fmt='csv', batch_size=BATCH_SIZE):
+    """企画をまとめて取り込む。不正な行はスキップしてエラーとして記録する
+
+    ファイル全体の問題（ヘッダー不足・文字コード不正など）で読めなくなった場合、
+    まだ何も登録していなければ ValueError を送出する。登録済みのバッチがあれば、
+    それまでに読めた行を登録したうえで、中断したことをエラーとして記録して結果を返す。
+    """
+    result = ImportResult()
+    batch = []
+    committed = False
+    last_line = 0
+
+    def flush():
+        nonlocal committed
+        created, duplicates = store.import_proposals(batch)
+        result.created += created
+        result.duplicates += duplicates
+        committed = True
+        batch.clear()
+
+    try:
+        for line_num, record, error in iter_records(stream, fmt):
+            last_line = line_num
+            if error:
+                result.errors.append((line_num, error))
+                continue
+            if not isinstance(record, dict):
+                result.errors.append((line_num, 'record must be an object'))
+                continue
+            row, error = parse_row(record)
+            if error:
+                result.errors.append((line_num, error))
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+    except (ValueError, csv.Error) as e:
+        if not committed:
+            raise ValueError(str(e)) from e
+        result.errors.append((last_line + 1, f'import stopped: {e}'))
+    if batch:
+        flush()
+    return result
+
+def format_for(filename, default='csv'):
+    """ファイル名の拡張子から形式を推定する"""
+    name = (filename or '').lower()
+    if name.endswith('.jsonl') or name.endswith('.ndjson'):
+        return 'jsonl'
+    if name.endswith('.json'):
+        return 'json'
+    return default
+
+def register_cli(app):
+    """`flask import-proposals FILE` コマンドを登録する"""
+
+    @app.cli.command('import-proposals')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'json', 'jsonl']), default=None,
+                  help='File format (guessed from the extension by default).')
+    @click.option('--event', 'slug', default=None, help='Event slug (the default event if omitted).')
+    def import_proposals_command(path, fmt, slug):
+        """Import proposals from a CSV / JSON / JSON Lines file."""
+        events = app.extensions['un_design_events']
+        event = events.get(slug) if slug else events.default
+        if event is None:
+            raise click.BadParameter(f'unknown event: {slug}', param_hint='--event')
+        with events.using(event) as store:
+            if not store.persistent:
+                click.echo('warning: the store is not persisted (set UN_DESIGN_STORE=sql or UN_DESIGN_DATA_DIR); '
+                           'imported proposals are lost on exit.', err=True)
+            with open(path, 'rb') as stream:
+                result = import_proposals(store, stream, fmt or format_for(path))
+        for line, message in result.errors:
+            click.echo(f'line {line}: {message}', err=True)
+        click.echo(f'created {result.created}, duplicates {result.duplicates}, errors {len(result.errors)}')
@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+import weakref
+
+# 1本のストリームを開いておく最大時間（秒）。切断後はブラウザが Last-Event-ID 付きで自動再接続する
+STREAM_MAX_DURATION = 300
+# 変化がないときにコメント行を送る間隔（秒）。プロキシによる切断を防ぐ
+HEARTBEAT_INTERVAL = 15
+
+# ストアごとのスナップショットキャッシュ: store -> {group: snapshot}
+_snapshots = weakref.WeakKeyDictionary()
+_snapshots_lock = threading.Lock()
+
+def _tally(p):
+    return {
+        'id': p.id,
+        'title': p.title,
+        'total_points': p.total_points,
+        'target_cost': p.target_cost,
+        'percent': int(p.achievement_ratio * 100),
+        'achieved': p.has_achieved,
+    }
+
+def group_snapshot(store, group):
+    """グループの集計状況（達成率の降順）を返す。同じバージョンの間は全接続で使い回す"""
+    version = store.data_version(group)
+    with _snapshots_lock:
+        cached = _snapshots.setdefault(store, {}).get(group)
+    if cached is not None and cached['version'] == version:
+        return cached
+    snapshot = {
+        'version': version,
+        'proposals': [_tally(p) for p in store.group_proposals(group, 'achievement')],
+    }
+    with _snapshots_lock:
+        _snapshots[store][group] = snapshot
+    return snapshot
+
+def tally_deltas(previous, current):
+    """2つのスナップショットの差分（変化した企画と削除された企画）を返す"""
+    before = {t['id']: t for t in previous['proposals']}
+    changed = [t for t in current['proposals'] if before.get(t['id']) != t]
+    current_ids = {t['id'] for t in current['proposals']}
+    removed = [pid for pid in before if pid not in current_ids]
+    return {
+        'version': current['version'],
+        'order': [t['id'] for t in current['proposals']],
+        'changed': changed,
+        'removed': removed,
+    }
+
+def _event(name, data, event_id):
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def stream_group(store, group, since=None, max_duration=STREAM_MAX_DURATION, heartbeat=HEARTBEAT_INTERVAL):
+    """グループの集計の変化を server-sent events として送り続けるジェネレータ"""
+    current = group_snapshot(store, group)
+    yield 'retry: 3000\n\n'
+    # クライアントの手元の状態が古ければ、まず全体を送る
+    if since is None or since != current['version']:
+        yield _event('snapshot', current, current['version'])
+
+    deadline = time.monotonic() + max_duration
+    while time.monotonic() < deadline:
+        if not store.wait_for_change(group, current['version'], heartbeat):
+            yield ': keep-alive\n\n'
+            continue
+        latest = group_snapshot(store, group)
+        delta = tally_deltas(current, latest)
+        current = latest
+        if delta['changed'] or delta['removed']:
+            yield _event('tally', delta, current['version'])
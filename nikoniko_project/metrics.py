@@ -0,0 +1,200 @@
+import bisect
+import cProfile
+import heapq
+import io
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, request, template_rendered, before_render_template
+
+# ヒストグラムのバケット（秒）
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) # 最後は +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+class Registry:
+    """カウンタ・ゲージ・ヒストグラムをプロセス内に保持する（値はワーカーごと）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)    # (name, labels) -> value
+        self._gauges = {}                      # (name, labels) -> value
+        self._histograms = defaultdict(Histogram) # (name, labels) -> Histogram
+        self._help = {}
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += amount
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._histograms[key].observe(seconds)
+
+    def render(self):
+        """Prometheus のテキスト形式で出力する"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.counts), h.total, h.count) for key, h in histograms]
+        lines = []
+        described = set()
+
+        def header(name):
+            if name in described or name not in self._help:
+                return
+            kind, text = self._help[name]
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            described.add(name)
+
+        for (name, labels), value in counters + gauges:
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), counts, total, count in histograms:
+            header(name)
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+def _labels(labels):
+    if not labels:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels)
+    return '{' + body + '}'
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+registry = Registry()
+registry.describe('un_design_requests_total', 'counter', 'Requests by endpoint and status.')
+registry.describe('un_design_request_duration_seconds', 'histogram', 'Total request time by endpoint.')
+registry.describe('un_design_view_duration_seconds', 'histogram', 'Request time excluding template rendering by endpoint.')
+registry.describe('un_design_template_render_seconds', 'histogram', 'Template render time by template.')
+registry.describe('un_design_login_attempts_total', 'counter', 'Login attempts by result.')
+registry.describe('un_design_votes_total', 'counter', 'Ballots committed.')
+registry.describe('un_design_ballot_errors_total', 'counter', 'Ballots rejected by validation, by first error code.')
+registry.describe('un_design_proposals_total', 'counter', 'Proposals created.')
+registry.describe('un_design_login_throttled_total', 'counter', 'Login POSTs rejected with 429 by the rate limiter, by bucket scope.')
+registry.describe('un_design_startup_seconds', 'gauge', 'Time spent in each create_app() phase and on the first request.')
+registry.describe('un_design_events_loaded', 'gauge', 'Events whose store is currently held in memory.')
+registry.describe('un_design_event_loads_total', 'counter', 'Event stores loaded (at startup or after eviction), by event.')
+registry.describe('un_design_event_load_seconds', 'histogram', 'Time to load or recover an event store.')
+registry.describe('un_design_event_evictions_total', 'counter', 'Idle event stores written out and dropped from memory, by event.')
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+# --- プロファイリング（任意） ---
+
+class SlowProfiles:
+    """遅いリクエストの cProfile 結果を、遅い順に上位 keep 件だけ保持する"""
+
+    def __init__(self, keep=10, threshold=0.2):
+        self.keep = keep
+        self.threshold = threshold
+        self._heap = [] # (seconds, seq, label, stats_text)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def offer(self, seconds, label, profiler):
+        if seconds < self.threshold:
+            return
+        with self._lock:
+            if len(self._heap) >= self.keep and seconds <= self._heap[0][0]:
+                return
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(30)
+        with self._lock:
+            self._seq += 1
+            entry = (seconds, self._seq, label, out.getvalue())
+            if len(self._heap) < self.keep:
+                heapq.heappush(self._heap, entry)
+            else:
+                heapq.heappushpop(self._heap, entry)
+
+    def report(self):
+        with self._lock:
+            entries = sorted(self._heap, reverse=True)
+        return '\n'.join(f"==== {label} {seconds * 1000:.1f}ms ====\n{text}" for seconds, _, label, text in entries)
+
+# --- Flask への組み込み ---
+
+def init_metrics(app):
+    """リクエストごとの計測を登録する。UN_DESIGN_PROFILE=1 なら遅いリクエストをプロファイルする"""
+    app.config.setdefault('UN_DESIGN_PROFILE', os.environ.get('UN_DESIGN_PROFILE') == '1')
+    app.config.setdefault('UN_DESIGN_PROFILE_SLOW_MS', float(os.environ.get('UN_DESIGN_PROFILE_SLOW_MS', 200)))
+    profiles = SlowProfiles(threshold=app.config['UN_DESIGN_PROFILE_SLOW_MS'] / 1000)
+    app.extensions['un_design_profiles'] = profiles
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+        g._metrics_render = 0.0
+        if app.config['UN_DESIGN_PROFILE']:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 別スレッドでプロファイラが動作中の場合（Python 3.12 以降）は計測しない
+                profiler = None
+            g._metrics_profiler = profiler
+
+    @app.after_request
+    def _record(response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unknown'
+        render = g.pop('_metrics_render', 0.0)
+        registry.inc('un_design_requests_total', endpoint=endpoint, status=response.status_code)
+        registry.observe('un_design_request_duration_seconds', elapsed, endpoint=endpoint)
+        registry.observe('un_design_view_duration_seconds', max(0.0, elapsed - render), endpoint=endpoint)
+
+        profiler = g.pop('_metrics_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            profiles.offer(elapsed, f"{request.method} {request.path}", profiler)
+        return response
+
+    def _render_started(sender, template, context, **extra):
+        g._metrics_render_start = time.perf_counter()
+
+    def _render_finished(sender, template, context, **extra):
+        start = g.pop('_metrics_render_start', None)
+        if start is None:
+            return
+        seconds = time.perf_counter() - start
+        g._metrics_render = g.get('_metrics_render', 0.0) + seconds
+        registry.observe('un_design_template_render_seconds', seconds, template=template.name or 'unknown')
+
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_finished, app, weak=False)
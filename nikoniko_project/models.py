@@ -1,22 +1,124 @@
+import time
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, select
+from sqlalchemy.orm import column_property
 
 db = SQLAlchemy()
 
 # 企画データ
 class Proposal(db.Model):
+    __tablename__ = 'proposals'
     id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(100), nullable=False)
-    author = db.Column(db.String(50), nullable=False)
-    description = db.Column(db.Text, nullable=False)
+    title = db.Column(db.Text, nullable=False)
+    author = db.Column(db.Text)
+    target = db.Column(db.Text)
+    category = db.Column(db.String(50), index=True) # 事業カテゴリ
+    problem = db.Column(db.Text)
+    details = db.Column(db.Text)
+    effect = db.Column(db.Text)
     # 3つの観点でのコスト（ポイント）
-    cost_pt_1 = db.Column(db.Integer, default=0) # 身体的手間
-    cost_pt_2 = db.Column(db.Integer, default=0) # 思考の余白
-    cost_pt_3 = db.Column(db.Integer, default=0) # 愛着の醸成
-    total_points = db.Column(db.Integer, default=0)
+    cost_pt_1 = db.Column(db.Integer, nullable=False, default=0) # 設計・開発
+    cost_pt_2 = db.Column(db.Integer, nullable=False, default=0) # 運用・維持
+    cost_pt_3 = db.Column(db.Integer, nullable=False, default=0) # 精神的・肉体的
+    creator_id = db.Column(db.String(20)) # 作成者のID
+    creator_group = db.Column(db.String(20), index=True) # 作成者のグループ（一覧・結果画面の絞り込み用）
+
+    votes = db.relationship('Vote', backref='proposal', cascade='all, delete-orphan', passive_deletes=True, lazy='dynamic')
+
+    __table_args__ = (
+        # 二重送信チェック（同じ作成者・同じタイトル）。複数ワーカーが同時に登録しても DB 側で弾く。
+        # 既存の DB には create_all() では追加されないため、
+        # CREATE UNIQUE INDEX uq_proposals_creator_title ON proposals (creator_id, title) を実行する
+        db.UniqueConstraint('creator_id', 'title', name='uq_proposals_creator_title'),
+    )
+
+    @property
+    def costs(self):
+        return [
+            ("設計・開発", self.cost_pt_1),
+            ("運用・維持", self.cost_pt_2),
+            ("精神的・肉体的", self.cost_pt_3)
+        ]
+
+    @property
+    def target_cost(self):
+        # 達成条件：3つのコストの合計値
+        return (self.cost_pt_1 or 0) + (self.cost_pt_2 or 0) + (self.cost_pt_3 or 0)
+
+    @property
+    def author_group(self):
+        return self.creator_group
+
+    @property
+    def achievement_ratio(self):
+        # 達成率（獲得ポイント / 目標コスト）
+        target = self.target_cost
+        return (self.total_points / target) if target > 0 else 0
+
+    @property
+    def has_achieved(self):
+        return self.total_points >= self.target_cost
+
+# 投票者1人分の投票（1人1行。主キーで二重投票をDB側でも防ぐ）
+class Ballot(db.Model):
+    __tablename__ = 'ballots'
+    voter_id = db.Column(db.String(20), primary_key=True)
+    voter_group = db.Column(db.String(20), index=True)
+    total_points = db.Column(db.Integer, nullable=False, default=0)
+    submitted_at = db.Column(db.Float, nullable=False, default=time.time)
+
+    votes = db.relationship('Vote', backref='ballot', cascade='all, delete-orphan', passive_deletes=True)
+
+    @property
+    def group(self):
+        return self.voter_group
+
+    @property
+    def allocations(self):
+        return {v.proposal_id: v.points for v in self.votes}
+
+# 企画ごとの投票ポイント
+class Vote(db.Model):
+    __tablename__ = 'votes'
+    id = db.Column(db.Integer, primary_key=True)
+    proposal_id = db.Column(db.Integer, db.ForeignKey('proposals.id', ondelete='CASCADE'), nullable=False, index=True)
+    voter_id = db.Column(db.String(20), db.ForeignKey('ballots.voter_id', ondelete='CASCADE'), nullable=False, index=True)
+    points = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('proposal_id', 'voter_id', name='uq_votes_proposal_voter'),
+    )
+
+# 獲得ポイント：登録者以外のユーザーによるポイントの合計（SQL側で集計）
+Proposal.total_points = column_property(
+    select(func.coalesce(func.sum(Vote.points), 0))
+    .where(Vote.proposal_id == Proposal.id, Vote.voter_id != Proposal.creator_id)
+    .correlate_except(Vote)
+    .scalar_subquery()
+)
 
 # フィードバック（旧 feedback.db の役割を統合）
 class Feedback(db.Model):
+    __tablename__ = 'reports'
     id = db.Column(db.Integer, primary_key=True)
-    type = db.Column(db.String(20)) # bug, ui, idea
-    env_id = db.Column(db.Integer)  # 1100-1450
-    details = db.Column(db.Text)
\ No newline at end of file
+    type = db.Column(db.String(20), index=True) # bug, ui, idea
+    env_id = db.Column(db.String(20)) # 1100-1450
+    details = db.Column(db.Text)
+    status = db.Column(db.String(20), nullable=False, default='unread', index=True) # unread, archived
+
+    # インメモリの Report と同じ名前で参照できるようにする
+    @property
+    def report_type(self):
+        return self.type
+
+    @property
+    def env_value(self):
+        return self.env_id
+
+# データ変更のたびに増えるバージョン（scope: '*' = 全体、それ以外はグループ名）
+# ワーカー間でキャッシュの無効化を共有するために使う
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+    scope = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
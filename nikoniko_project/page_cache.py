@@ -0,0 +1,67 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+from flask import make_response, render_template, request
+
+# ストアごとのレンダリング結果キャッシュ: store -> RenderCache
+_caches = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+class RenderCache:
+    """(テンプレート, キー) ごとに最新バージョンの HTML を保持する LRU キャッシュ"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # (template, key) -> (version, html, etag)
+        self._lock = threading.Lock()
+
+    def get(self, cache_key, version):
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(cache_key)
+            return entry
+
+    def put(self, cache_key, version, html):
+        entry = (version, html, hashlib.sha1(html.encode('utf-8')).hexdigest())
+        with self._lock:
+            self._entries[cache_key] = entry
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+def _cache_for(store):
+    with _caches_lock:
+        cache = _caches.get(store)
+        if cache is None:
+            cache = _caches[store] = RenderCache()
+        return cache
+
+def render_cached(store, template, key, version, build_context, personalize=None, variant=None):
+    """同じキー・同じバージョンなら前回の HTML を返し、ETag による 304 応答にも対応する
+
+    build_context はキャッシュにない場合だけ呼ばれ、テンプレートに渡す dict を返す。
+    personalize があれば、キャッシュした共有の HTML を応答ごとにその関数で書き換える（本人専用の部分など）。
+    variant は書き換えの内容を区別する値で、ETag に含める。
+    """
+    cache = _cache_for(store)
+    cache_key = (template, key)
+    entry = cache.get(cache_key, version)
+    if entry is None:
+        html = render_template(template, **build_context())
+        entry = cache.put(cache_key, version, html)
+    _, html, etag = entry
+    if personalize is not None:
+        html = personalize(html)
+        etag = f"{etag}-{hashlib.sha1(str(variant).encode('utf-8')).hexdigest()[:16]}"
+
+    response = make_response(html)
+    response.set_etag(etag)
+    # セッションごとに内容が変わるため共有キャッシュには載せず、毎回 ETag で再検証させる
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
@@ -0,0 +1,190 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+# 変更ログ・スナップショットのファイル名（UN_DESIGN_DATA_DIR 以下）
+WAL_NAME = 'wal.jsonl'
+SNAPSHOT_NAME = 'snapshot.json'
+# スナップショットにまとめている途中の（切り替え済みの）変更ログ
+SEGMENT_NAME = 'wal.compacting.jsonl'
+
+logger = logging.getLogger(__name__)
+
+# この件数だけ変更ログが溜まったらスナップショットを取り、ログを空にする
+SNAPSHOT_EVERY = 1000
+
+class Journal:
+    """メモリストアの変更ログ（1行1件の JSON Lines）とスナップショットを管理する
+
+    各レコードには連番 seq を付け、スナップショットには取得時点の seq を記録する。
+    スナップショットの書き込み後・ログを空にする前に落ちても、再生時に seq で重複を除ける。
+
+    運用中のスナップショットは start_compaction() でバックグラウンドのスレッドが作る。
+    リクエストのスレッドはログのファイルを切り替えるだけで、ストア全体の書き出しを待たない。
+    """
+
+    def __init__(self, directory, fsync=False, snapshot_every=SNAPSHOT_EVERY):
+        self.directory = directory
+        self.fsync = fsync # True なら1件ごとに fsync する（OS ごと落ちても失わないが遅い）
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        self.pending = 0 # 前回のスナップショット以降のレコード数
+        self.wal_path = os.path.join(directory, WAL_NAME)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.segment_path = os.path.join(directory, SEGMENT_NAME)
+        self._wal = None
+        self._compactor = None # スナップショットを作成中のスレッド
+
+    # --- 書き込み ---
+
+    def append(self, op, data):
+        self.seq += 1
+        record = {'seq': self.seq, 'op': op, 'data': data}
+        self._wal.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+        self.pending += 1
+
+    def snapshot_due(self):
+        return self.pending >= self.snapshot_every
+
+    def write_snapshot(self, state):
+        """スナップショットを書き、変更ログ（切り替え済みのものも）を空にする（起動時・退避時用）"""
+        self.wait_compaction()
+        self._write_snapshot_file(state, self.seq)
+        self._open_wal('w')
+        if os.path.exists(self.segment_path):
+            os.remove(self.segment_path)
+        self.pending = 0
+
+    def start_compaction(self, make_store):
+        """変更ログを切り替え、切り替えたログを前回のスナップショットに適用したものをバックグラウンドで書き出す
+
+        ストアのロック内で呼ぶが、ここで行うのはファイル名の変更だけ。make_store は空のストアを作る関数。
+        前回の書き出しが終わっていなければ何もしない（次の書き込みで再び試みる）。
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            return False
+        if not os.path.exists(self.segment_path):
+            # 前回の書き出しが失敗して残っているログは上書きせず、先にそれをまとめる
+            self._wal.close()
+            self._wal = None
+            os.replace(self.wal_path, self.segment_path)
+            self._open_wal('w')
+            self.pending = 0
+        # 名簿（roster.use_roster）などのコンテキストを引き継ぐ
+        context = contextvars.copy_context()
+        self._compactor = threading.Thread(target=context.run, args=(self._compact, make_store),
+                                           name='un-design-compaction', daemon=True)
+        self._compactor.start()
+        return True
+
+    def wait_compaction(self):
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def _compact(self, make_store):
+        try:
+            start = time.perf_counter()
+            store = make_store()
+            seq = self._load_snapshot(store)
+            _, seq = self._replay(self.segment_path, store, seq)
+            self._write_snapshot_file(store.export_state(), seq)
+            os.remove(self.segment_path)
+            logger.info("Compacted %s up to seq %d in %.1f ms", self.directory, seq, (time.perf_counter() - start) * 1000)
+        except Exception:
+            # 切り替えたログは残っているので、再起動時の復元や次回の書き出しで使われる
+            logger.exception("Compaction of %s failed", self.directory)
+
+    def _write_snapshot_file(self, state, seq):
+        """スナップショットを一時ファイル経由で置き換える"""
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'seq': seq, 'saved_at': time.time(), 'state': state}, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _open_wal(self, mode):
+        if self._wal is not None:
+            self._wal.close()
+        self._wal = open(self.wal_path, mode, encoding='utf-8')
+
+    def close(self):
+        self.wait_compaction()
+        if self._wal is not None:
+            self._wal.close()
+            self._wal = None
+
+    # --- 復元 ---
+
+    def recover(self, store):
+        """スナップショットを読み込み、その後の変更ログを再生する。(スナップショットの有無, 再生件数) を返す"""
+        has_snapshot = os.path.exists(self.snapshot_path)
+        snapshot_seq = self.seq = self._load_snapshot(store)
+        replayed = 0
+        # 書き出しの途中で止まっていれば、切り替え済みのログ・現在のログの順に再生する
+        for path in (self.segment_path, self.wal_path):
+            count, seq = self._replay(path, store, snapshot_seq)
+            replayed += count
+            self.seq = max(self.seq, seq)
+        return has_snapshot, replayed
+
+    def _load_snapshot(self, store):
+        """スナップショットがあれば読み込み、その seq を返す"""
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        with open(self.snapshot_path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+        store.load_state(snapshot['state'])
+        return snapshot['seq']
+
+    def _replay(self, path, store, after_seq):
+        """ログのうち seq が after_seq より後のレコードを適用する。(適用件数, 最後の seq) を返す"""
+        replayed = 0
+        seq = after_seq
+        if not os.path.exists(path):
+            return replayed, seq
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 書き込み途中で落ちた最後の行は捨てる
+                    break
+                if record['seq'] <= after_seq:
+                    continue
+                store.apply(record['op'], record['data'])
+                seq = record['seq']
+                replayed += 1
+        return replayed, seq
+
+def open_journal(app, store, directory, seed=True):
+    """保存済みのデータからストアを復元し、以降の変更をログに記録するようにする"""
+    os.makedirs(directory, exist_ok=True)
+    journal = Journal(
+        directory,
+        fsync=app.config.get('UN_DESIGN_WAL_FSYNC', False),
+        snapshot_every=app.config.get('UN_DESIGN_SNAPSHOT_EVERY', SNAPSHOT_EVERY),
+    )
+    start = time.perf_counter()
+    has_snapshot, replayed = journal.recover(store)
+    if seed and not has_snapshot and not replayed:
+        store.seed_samples()
+    # 差分更新した集計値が投票の全件走査と一致するか確かめ、ずれていれば直してから受け付けを始める
+    mismatched = store.verify_tallies(repair=True)
+    if mismatched:
+        app.logger.warning("Repaired tallies of %d proposals after recovery: %s", len(mismatched), mismatched[:20])
+    # 起動時に1度スナップショットを取り、再生済みのログを片付ける
+    journal.write_snapshot(store.export_state())
+    store.journal = journal
+    app.logger.info(
+        "Recovered memory store from %s in %.1f ms (snapshot=%s, replayed=%d records)",
+        directory, (time.perf_counter() - start) * 1000, has_snapshot, replayed,
+    )
+    return journal
@@ -0,0 +1,167 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, request
+
+import metrics
+from events import current_event
+from roster import parse_id
+
+# ログイン（POST /un_design/）の既定の制限：(1秒あたりの補充数, バケットの容量)
+# 教室の生徒は学校のネットワーク（同じ IP）からまとめてログインするため、IP 単位は大きめにする
+IP_RATE = 5.0
+IP_BURST = 300
+VOTER_RATE = 0.1
+VOTER_BURST = 5
+
+# 1つのバックエンドが保持するバケット数の上限（超えたら最も長く使われていないキーから捨てる）
+MAX_KEYS = 10000
+
+THROTTLED_MESSAGE = 'TOO MANY LOGIN ATTEMPTS. TRY AGAIN IN {} SECONDS.\n'
+
+def _consume(state, now, rate, burst):
+    """バケットから1トークン取り出す。(許可するか, 残りトークン) を返す"""
+    if state is None:
+        tokens = burst
+    else:
+        tokens, updated = state
+        tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+    if tokens >= 1:
+        return True, tokens - 1
+    return False, tokens
+
+def _retry_after(tokens, rate):
+    return (1 - tokens) / rate
+
+class MemoryRateLimiter:
+    """キーごとのトークンバケットをプロセス内に保持する（ワーカーごとに独立）"""
+
+    def __init__(self, max_keys=MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict() # key -> (tokens, updated)。末尾ほど最近使われたキー
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def allow(self, key, rate, burst, now=None):
+        """1トークン消費できれば (True, 0)、できなければ (False, 次のトークンまでの秒数) を返す"""
+        now = time.time() if now is None else now
+        with self._lock:
+            allowed, tokens = _consume(self._buckets.pop(key, None), now, rate, burst)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else _retry_after(tokens, rate)
+
+class SQLiteRateLimiter:
+    """SQLite ファイルにバケットを保存する（同じホスト上の複数ワーカーで制限を共有できる）"""
+
+    # この回数の書き込みごとに、最近使われていないバケットを max_keys 件まで削除する
+    PURGE_EVERY = 1000
+
+    def __init__(self, path, max_keys=MAX_KEYS):
+        self.path = path
+        self.max_keys = max_keys
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_buckets_updated ON buckets (updated)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # 読み取りと更新を1つのトランザクション（BEGIN IMMEDIATE）で行うため自動コミットにしておく
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+    def allow(self, key, rate, burst, now=None):
+        """1トークン消費できれば (True, 0)、できなければ (False, 次のトークンまでの秒数) を返す"""
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            allowed, tokens = _consume(row, now, rate, burst)
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM buckets WHERE key IN (SELECT key FROM buckets ORDER BY updated DESC LIMIT -1 OFFSET ?)",
+                    (self.max_keys,),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0.0 if allowed else _retry_after(tokens, rate)
+
+def client_ip(proxy_hops=0):
+    """クライアントの IP。proxy_hops 段のリバースプロキシ（Render など）の後ろなら X-Forwarded-For から読む"""
+    if proxy_hops:
+        forwarded = [part.strip() for part in request.headers.get('X-Forwarded-For', '').split(',') if part.strip()]
+        if len(forwarded) >= proxy_hops:
+            return forwarded[-proxy_hops]
+    return request.remote_addr or ''
+
+def too_many_requests(retry_after):
+    """テンプレートを使わない 429 応答"""
+    seconds = max(1, math.ceil(retry_after))
+    response = Response(THROTTLED_MESSAGE.format(seconds), 429, mimetype='text/plain')
+    response.headers['Retry-After'] = str(seconds)
+    return response
+
+def init_rate_limit(app):
+    """ログインの POST に IP 単位・投票者ID 単位のトークンバケットを設定する
+
+    UN_DESIGN_RATE_LIMIT_BACKEND: memory（既定）/ sqlite（sql ストアの既定・複数ワーカーで共有）/ off
+    """
+    backend_name = app.config.get('UN_DESIGN_RATE_LIMIT_BACKEND', 'memory')
+    if backend_name == 'off':
+        app.extensions['un_design_rate_limit'] = None
+        return None
+    if backend_name == 'sqlite':
+        backend = SQLiteRateLimiter(app.config['UN_DESIGN_RATE_LIMIT_DB'])
+    else:
+        backend = MemoryRateLimiter()
+    app.extensions['un_design_rate_limit'] = backend
+
+    ip_limit = (app.config.get('UN_DESIGN_LOGIN_IP_RATE', IP_RATE), app.config.get('UN_DESIGN_LOGIN_IP_BURST', IP_BURST))
+    voter_limit = (app.config.get('UN_DESIGN_LOGIN_VOTER_RATE', VOTER_RATE), app.config.get('UN_DESIGN_LOGIN_VOTER_BURST', VOTER_BURST))
+    proxy_hops = app.config.get('UN_DESIGN_PROXY_HOPS', 0)
+
+    @app.before_request
+    def _throttle_login():
+        if request.method != 'POST' or request.endpoint != 'un_design.gate':
+            return None
+        # IP 単位の判定はフォームを読む前に行う
+        scope = 'ip'
+        allowed, retry_after = backend.allow(f'ip:{client_ip(proxy_hops)}', *ip_limit)
+        if allowed:
+            # 投票者ID 単位のバケットは名簿にある ID だけに作る（キーの数が名簿の人数を超えない）
+            # 同じ出席番号が別のイベントにもいるため、キーにはイベントを含める
+            voter_id = request.form.get('voter_id', '').strip()
+            event = current_event()
+            if event.roster.is_member(voter_id):
+                scope = 'voter'
+                allowed, retry_after = backend.allow(f'voter:{event.slug}:{parse_id(voter_id)}', *voter_limit)
+        if allowed:
+            return None
+        metrics.inc('un_design_login_throttled_total', scope=scope)
+        return too_many_requests(retry_after)
+
+    return backend
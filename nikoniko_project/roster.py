@@ -0,0 +1,112 @@
+import json
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# 既定の名簿（クラスごとの出席番号の範囲）。UN_DESIGN_ROSTER で JSON ファイルを指定すると置き換わる
+DEFAULT_COHORTS = [
+    {'group': '1組', 'first': 1101, 'last': 1150},
+    {'group': '2組', 'first': 1201, 'last': 1250},
+    {'group': '3組', 'first': 1301, 'last': 1350},
+    {'group': '4組', 'first': 1401, 'last': 1450},
+]
+
+# 数字だけの投票者ID（str.isdigit() は '²' なども真になり、int() で失敗する）
+DIGITS = re.compile(r'[0-9]+')
+
+def parse_id(voter_id):
+    """投票者IDを int に変換する（数字でなければ None）"""
+    if isinstance(voter_id, int):
+        return voter_id
+    if not voter_id:
+        return None
+    voter_id = str(voter_id)
+    return int(voter_id) if DIGITS.fullmatch(voter_id) else None
+
+class Roster:
+    """投票者ID -> グループの対応表
+
+    起動時に名簿から最小ID〜最大IDの配列を作っておき、グループの判定は配列の添字参照1回で行う。
+
+    cohorts は {'group': 名前, 'first': 最初のID, 'last': 最後のID} または
+    {'group': 名前, 'ids': [ID, ...]} のリスト。names は ID -> 氏名（任意）。
+    """
+
+    def __init__(self, cohorts, names=None):
+        self.groups = []
+        members = {}
+        for cohort in cohorts:
+            group = cohort['group']
+            if group not in self.groups:
+                self.groups.append(group)
+            ids = cohort.get('ids') or range(int(cohort['first']), int(cohort['last']) + 1)
+            for vid in ids:
+                vid = int(vid)
+                if vid in members and members[vid] != group:
+                    raise ValueError(f'voter {vid} is in both {members[vid]} and {group}')
+                members[vid] = group
+        self.base = min(members) if members else 0
+        self._table = [None] * ((max(members) - self.base + 1) if members else 0)
+        for vid, group in members.items():
+            self._table[vid - self.base] = group
+        self._names = {int(vid): name for vid, name in (names or {}).items()}
+        self.size = len(members)
+
+    @classmethod
+    def from_file(cls, path):
+        """JSON の名簿ファイル（{"cohorts": [...], "names": {...}}）を読み込む"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['cohorts'], data.get('names'))
+
+    def group_of(self, voter_id):
+        """投票者のグループを返す（名簿にないIDは None）"""
+        vid = parse_id(voter_id)
+        if vid is None:
+            return None
+        i = vid - self.base
+        if 0 <= i < len(self._table):
+            return self._table[i]
+        return None
+
+    def is_member(self, voter_id):
+        return self.group_of(voter_id) is not None
+
+    def name_of(self, voter_id):
+        return self._names.get(parse_id(voter_id))
+
+    def voter_ids(self, group=None):
+        """名簿のID（group を指定するとそのグループのみ）を昇順で返す"""
+        return [self.base + i for i, g in enumerate(self._table) if g is not None and (group is None or g == group)]
+
+# 既定の名簿（init_roster で差し替える）
+_active = Roster(DEFAULT_COHORTS)
+
+# リクエスト中のイベントの名簿（events.EventDispatcher が use_roster で設定する）
+_current = ContextVar('un_design_roster', default=None)
+
+def active_roster():
+    """現在のイベントの名簿（イベントの外では既定の名簿）"""
+    return _current.get() or _active
+
+@contextmanager
+def use_roster(roster):
+    """with の中だけ active_roster() を roster にする"""
+    token = _current.set(roster)
+    try:
+        yield roster
+    finally:
+        _current.reset(token)
+
+def load_roster(path=None):
+    """JSON の名簿ファイルを読み込む（未指定なら DEFAULT_COHORTS）"""
+    return Roster.from_file(path) if path else Roster(DEFAULT_COHORTS)
+
+def init_roster(app, roster=None):
+    """設定（UN_DESIGN_ROSTER）の名簿、または roster を既定の名簿にする"""
+    global _active
+    if roster is None:
+        roster = load_roster(app.config.get('UN_DESIGN_ROSTER'))
+    app.extensions['un_design_roster'] = roster
+    _active = roster
+    return roster
@@ -0,0 +1,194 @@
+import heapq
+import math
+import sys
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+# 検索対象の項目と重み（タイトル・カテゴリの一致を本文より上位にする）
+FIELD_WEIGHTS = {
+    'title': 3,
+    'category': 2,
+    'problem': 1,
+    'details': 1,
+    'effect': 1,
+}
+
+# 同じ検索語の結果を覚えておく件数（入力中の再検索・複数の管理者からの同じ検索用）
+RESULT_CACHE_SIZE = 256
+
+# 候補の最も少ない posting がこの件数以下なら全て採点する（それより多ければ impact 順に読んで打ち切る）
+EXHAUSTIVE_MAX = 512
+# impact 順に並べ替えた posting を保持する gram の数（検索された gram だけを保持する）
+IMPACT_CACHE_SIZE = 1024
+
+# 文字 n-gram の長さ（形態素解析なしで日本語を扱うため 2-gram を使い、1文字の検索語用に 1-gram も持つ）
+GRAM = 2
+
+def normalize(text):
+    """全角英数・半角カナなどを揃え、小文字にする"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+def grams(text):
+    """空白で区切った語ごとに 2-gram と 1-gram（1文字の検索語用）に分割する"""
+    for word in normalize(text).split():
+        yield from word
+        for i in range(len(word) - GRAM + 1):
+            yield word[i:i + GRAM]
+
+def query_grams(term):
+    """検索語を照合に使う gram に分割する（2文字以上なら 2-gram のみ）"""
+    if len(term) < GRAM:
+        return {term}
+    return {term[i:i + GRAM] for i in range(len(term) - GRAM + 1)}
+
+class SearchIndex:
+    """企画の転置インデックス（gram -> {proposal_id: 重み付き出現数}）
+
+    スコアは一致した gram ごとの 重み付き出現数 × IDF の合計。候補が少なければ全て採点して
+    上位 limit 件をヒープで取り出す。多ければ、出現数の多い順に並べた posting（impact 順）を
+    先頭から読み、まだ読んでいない企画が上位に入り得なくなった時点で打ち切る（threshold algorithm）。
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(dict)
+        self._impacts = {}                 # gram -> [(-重み付き出現数, proposal_id), ...]（検索された gram のみ）
+        self._docs = {}                    # proposal_id -> 含まれる gram のタプル（削除用。出現数は _postings から読む）
+        self._groups = {}                  # proposal_id -> グループ
+        self._group_ids = defaultdict(set) # グループ -> proposal_id の集合
+        self._results = {}                 # (query, group, limit) -> 検索結果（登録・削除で破棄）
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, p):
+        """企画を登録する（登録済みなら置き換える）"""
+        self.remove(p.id)
+        self._results.clear()
+        counts = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for gram in grams(getattr(p, field, None)):
+                counts[gram] += weight
+        # gram の文字列は全企画で同じオブジェクトを共有する（_docs のタプルが企画ごとに複製を持たないように）
+        counts = {sys.intern(gram): count for gram, count in counts.items()}
+        for gram, count in counts.items():
+            self._postings[gram][p.id] = count
+            impact = self._impacts.get(gram)
+            if impact is not None:
+                insort(impact, (-count, p.id))
+        self._docs[p.id] = tuple(counts)
+        self._groups[p.id] = p.author_group
+        self._group_ids[p.author_group].add(p.id)
+
+    def remove(self, proposal_id):
+        doc_grams = self._docs.pop(proposal_id, None)
+        if doc_grams is None:
+            return
+        self._results.clear()
+        self._group_ids[self._groups.pop(proposal_id)].discard(proposal_id)
+        for gram in doc_grams:
+            posting = self._postings[gram]
+            count = posting.pop(proposal_id)
+            if not posting:
+                del self._postings[gram]
+                self._impacts.pop(gram, None)
+                continue
+            impact = self._impacts.get(gram)
+            if impact is not None:
+                del impact[bisect_left(impact, (-count, proposal_id))]
+
+    def search(self, query, group=None, limit=20):
+        """全ての検索語を含む企画を、スコアの高い順に (proposal_id, score) で返す"""
+        key = (query, group, limit)
+        results = self._results.get(key)
+        if results is None:
+            results = self._search(query, group, limit)
+            if len(self._results) >= RESULT_CACHE_SIZE:
+                self._results.pop(next(iter(self._results)))
+            self._results[key] = results
+        return list(results)
+
+    def _search(self, query, group, limit):
+        terms = {}
+        for term in normalize(query).split():
+            for gram in query_grams(term):
+                posting = self._postings.get(gram)
+                if not posting:
+                    return []
+                terms[gram] = posting
+        if not terms or limit <= 0:
+            return []
+        members = self._group_ids.get(group, set()) if group is not None else None
+        total = len(self._docs)
+        # (IDF, posting, gram) を件数の少ない順に並べる
+        weighted = sorted(((math.log(1 + total / len(posting)), posting, gram) for gram, posting in terms.items()),
+                          key=lambda item: len(item[1]))
+        if len(weighted[0][1]) <= EXHAUSTIVE_MAX:
+            ranked = self._score_all(weighted, members, limit)
+        else:
+            ranked = self._score_top(weighted, members, limit)
+        return [(pid, score) for score, pid in ranked]
+
+    def _score_all(self, weighted, members, limit):
+        """候補（全ての posting の積）を全て採点し、上位 limit 件を (score, proposal_id) で返す"""
+        candidates = set(weighted[0][1])
+        for _, posting, _ in weighted[1:]:
+            candidates.intersection_update(posting)
+        if members is not None:
+            candidates.intersection_update(members)
+        scored = []
+        for pid in candidates:
+            score = 0.0
+            for idf, posting, _ in weighted:
+                score += idf * posting[pid]
+            scored.append((score, pid))
+        # スコアの高い順、同点なら ID の小さい順
+        return heapq.nlargest(limit, scored, key=_rank_key)
+
+    def _score_top(self, weighted, members, limit):
+        """impact 順の posting を同じ深さずつ読み、上位 limit 件が確定したら打ち切る"""
+        lists = [(idf, posting, self._impact(gram)) for idf, posting, gram in weighted]
+        seen = set()
+        top = [] # (score, -proposal_id) の最小ヒープ（上位 limit 件）
+        # いずれかの posting を読み終えたら、読んでいない企画はその gram を含まないので候補にならない
+        for depth in range(min(len(impact) for _, _, impact in lists)):
+            # まだ読んでいない企画のスコアの上限
+            threshold = 0.0
+            for idf, _, impact in lists:
+                negative_count, pid = impact[depth]
+                threshold -= idf * negative_count
+                if pid in seen:
+                    continue
+                seen.add(pid)
+                if members is not None and pid not in members:
+                    continue
+                score = 0.0
+                for other_idf, posting, _ in lists:
+                    count = posting.get(pid)
+                    if count is None:
+                        break
+                    score += other_idf * count
+                else:
+                    item = (score, -pid)
+                    if len(top) < limit:
+                        heapq.heappush(top, item)
+                    elif item > top[0]:
+                        heapq.heapreplace(top, item)
+            # 同点の企画は ID の小さい順にするため、上限と等しい間は読み続ける
+            # （posting が1つなら impact 順が同点内で ID 順なので、等しくなった時点で確定する）
+            if len(top) == limit and (top[0][0] > threshold or (len(lists) == 1 and top[0][0] >= threshold)):
+                break
+        return [(score, -negative_pid) for score, negative_pid in sorted(top, reverse=True)]
+
+    def _impact(self, gram):
+        """gram の posting を (重み付き出現数の降順, ID の昇順) に並べたリスト。以降は登録・削除で差分更新する"""
+        impact = self._impacts.get(gram)
+        if impact is None:
+            if len(self._impacts) >= IMPACT_CACHE_SIZE:
+                self._impacts.pop(next(iter(self._impacts)))
+            impact = self._impacts[gram] = sorted((-count, pid) for pid, count in self._postings[gram].items())
+        return impact
+
+def _rank_key(item):
+    score, pid = item
+    return score, -pid
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import has_request_context, request
+from flask.sessions import SecureCookieSessionInterface, SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+# セッションの有効期間（秒）。アクセスのたびに延長する
+SESSION_TTL = 8 * 60 * 60
+
+# リクエストごとの Cookie 名（イベントごとに Cookie を分けるため events.EventDispatcher が設定する）
+COOKIE_ENVIRON = 'un_design.session_cookie'
+
+class ServerSession(CallbackDict, SessionMixin):
+    """サーバー側に保存するセッション。Cookie には ID だけを載せる"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.rotate = False # ログイン・ログアウト時に ID を振り直す
+
+    def __setitem__(self, key, value):
+        # 同じ値の再代入（index での has_voted の同期など）では保存し直さない
+        if key in self and self[key] == value:
+            return
+        super().__setitem__(key, value)
+
+    def clear(self):
+        if self:
+            self.rotate = True
+        super().clear()
+
+def session_handle(sid):
+    """管理画面に表示する識別子（セッションIDそのものは出さない）"""
+    return hashlib.sha256(sid.encode()).hexdigest()[:16]
+
+def _describe(sid, data, created, expires):
+    return {
+        'handle': session_handle(sid),
+        'voter_id': data.get('voter_id'),
+        'group': data.get('group'),
+        'is_admin': bool(data.get('is_admin')),
+        'event': data.get('event'),
+        'created': created,
+        'expires': expires,
+    }
+
+# --- 保存先 ---
+
+class MemorySessionBackend:
+    """プロセス内メモリに保存する（単一ワーカー向け）。期限切れは古い順に掃除する"""
+
+    def __init__(self, ttl=SESSION_TTL, max_entries=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # sid -> [data, created, expires]（最終アクセス順）
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[2] < now:
+                del self._entries[sid]
+                return None
+            entry[2] = now + self.ttl
+            self._entries.move_to_end(sid)
+            return dict(entry[0])
+
+    def save(self, sid, data):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(sid)
+            created = entry[1] if entry else now
+            self._entries[sid] = [dict(data), created, now + self.ttl]
+            self._entries.move_to_end(sid)
+            self._evict(now)
+
+    def touch(self, sid):
+        # 有効期限の延長は get() で済んでいる
+        pass
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def _evict(self, now):
+        # 先頭ほど最終アクセスが古い
+        while self._entries:
+            sid, entry = next(iter(self._entries.items()))
+            if entry[2] >= now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[sid]
+
+    def sessions(self):
+        now = time.time()
+        with self._lock:
+            return [_describe(sid, data, created, expires)
+                    for sid, (data, created, expires) in self._entries.items() if expires >= now]
+
+    def revoke(self, handle):
+        with self._lock:
+            targets = [sid for sid in self._entries if session_handle(sid) == handle]
+            for sid in targets:
+                del self._entries[sid]
+        return bool(targets)
+
+class SQLiteSessionBackend:
+    """SQLite ファイルに保存する（同じホスト上の複数ワーカーで共有できる）"""
+
+    # 有効期限の延長を書き込む最小間隔（秒）。毎リクエストの書き込みを避ける
+    TOUCH_INTERVAL = 60
+    # この回数の書き込みごとに期限切れの行を削除する
+    PURGE_EVERY = 500
+
+    def __init__(self, path, ttl=SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        # 既定の保存先（instance/sessions.db）のディレクトリは初回起動時にはまだない
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " sid TEXT PRIMARY KEY, data TEXT NOT NULL, created REAL NOT NULL, expires REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions (expires)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        row = self._connect().execute("SELECT data, expires FROM sessions WHERE sid = ?", (sid,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        self._local.expires = row[1]
+        return json.loads(row[0])
+
+    def save(self, sid, data):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (sid, data, created, expires) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(sid) DO UPDATE SET data = excluded.data, expires = excluded.expires",
+                (sid, json.dumps(data, ensure_ascii=False), now, now + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                conn.execute("DELETE FROM sessions WHERE expires < ?", (now,))
+
+    def touch(self, sid):
+        # 直前の get() で読んだ有効期限が十分先なら書き込まない
+        now = time.time()
+        expires = getattr(self._local, 'expires', 0)
+        if expires - now > self.ttl - self.TOUCH_INTERVAL:
+            return
+        with self._connect() as conn:
+            conn.execute("UPDATE sessions SET expires = ? WHERE sid = ?", (now + self.ttl, sid))
+
+    def delete(self, sid):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+    def sessions(self):
+        rows = self._connect().execute(
+            "SELECT sid, data, created, expires FROM sessions WHERE expires >= ? ORDER BY expires DESC", (time.time(),)
+        ).fetchall()
+        return [_describe(sid, json.loads(data), created, expires) for sid, data, created, expires in rows]
+
+    def revoke(self, handle):
+        sids = [sid for (sid,) in self._connect().execute("SELECT sid FROM sessions")]
+        targets = [(sid,) for sid in sids if session_handle(sid) == handle]
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM sessions WHERE sid = ?", targets)
+        return bool(targets)
+
+# --- Flask への組み込み ---
+
+class _EventCookieName:
+    def get_cookie_name(self, app):
+        name = request.environ.get(COOKIE_ENVIRON) if has_request_context() else None
+        return name or super().get_cookie_name(app)
+
+class CookieSessionInterface(_EventCookieName, SecureCookieSessionInterface):
+    """Flask 標準の署名付き Cookie セッション（Cookie 名だけリクエストに合わせる）"""
+
+class ServerSessionInterface(_EventCookieName, SessionInterface):
+    def __init__(self, backend):
+        self.backend = backend
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.backend.get(sid)
+            if data is not None:
+                return ServerSession(data, sid=sid)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        response.vary.add('Cookie')
+
+        if not session:
+            # 空になったセッション（ログアウト・ログイン失敗）は保存先と Cookie から消す
+            if not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.rotate and not session.new:
+            # セッション固定攻撃を防ぐため、ログイン時は新しい ID に切り替える
+            self.backend.delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+            session.new = True
+
+        if session.new or session.modified:
+            self.backend.save(session.sid, dict(session))
+        else:
+            self.backend.touch(session.sid)
+
+        # Cookie は ID が新しく発行されたときだけ送る
+        if session.new:
+            response.set_cookie(
+                name, session.sid,
+                domain=domain, path=path,
+                httponly=self.get_cookie_httponly(app),
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+def init_sessions(app):
+    """UN_DESIGN_SESSION_BACKEND（memory / sqlite / cookie）に応じてセッションの保存先を設定する"""
+    backend_name = app.config.get('UN_DESIGN_SESSION_BACKEND', 'sqlite')
+    ttl = app.config.get('UN_DESIGN_SESSION_TTL', SESSION_TTL)
+    if backend_name == 'cookie':
+        # Flask 標準の署名付き Cookie セッション
+        backend = None
+        app.session_interface = CookieSessionInterface()
+    elif backend_name == 'memory':
+        backend = MemorySessionBackend(ttl)
+    else:
+        backend = SQLiteSessionBackend(app.config['UN_DESIGN_SESSION_DB'], ttl)
+    if backend is not None:
+        app.session_interface = ServerSessionInterface(backend)
+    app.extensions['un_design_sessions'] = backend
+    return backend
@@ -0,0 +1,424 @@
+import os
+import threading
+import time
+
+from flask import appcontext_pushed
+from sqlalchemy import case, event, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import db, Proposal, Ballot, Vote, Feedback, DataVersion
+from search import SearchIndex
+from store import ALL_GROUPS, BALLOT_POINTS, PAGE_SIZE, PROPOSAL_FIELDS, safe_int, get_group_from_id
+
+# 達成率順の並び替え用（目標コスト0の企画は0として扱う）
+_target_cost = Proposal.cost_pt_1 + Proposal.cost_pt_2 + Proposal.cost_pt_3
+_achievement = case((_target_cost > 0, Proposal.total_points * 1.0 / _target_cost), else_=0)
+
+# 他ワーカーの変更を検知するためにバージョンを確認する間隔（秒）
+POLL_INTERVAL = 1.0
+
+ORDER_BY = {
+    'cost': _target_cost.desc(),       # コスト合計値
+    'achievement': _achievement.desc(), # 達成率
+}
+
+def engine_options(db_url):
+    """接続プールの設定（環境変数で調整可能）"""
+    options = {
+        'pool_pre_ping': True, # 切断済みの接続を使う前に検出する
+        'pool_recycle': safe_int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    if db_url and db_url.startswith('postgresql'):
+        options['pool_size'] = safe_int(os.environ.get('DB_POOL_SIZE', 5))
+        options['max_overflow'] = safe_int(os.environ.get('DB_MAX_OVERFLOW', 10))
+        options['pool_timeout'] = safe_int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    return options
+
+def init_database(app):
+    """DB（接続プールの設定を含む）を登録し、テーブルを作成する
+
+    UN_DESIGN_LAZY_DB が有効なら、接続とスキーマの確認（create_all）を最初にアプリコンテキストが
+    作られるとき（最初のリクエストまたは CLI コマンド）まで遅らせ、起動を速くする。
+    """
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    db.init_app(app)
+    if not app.config.get('UN_DESIGN_LAZY_DB'):
+        with app.app_context():
+            db.create_all()
+        return
+
+    lock = threading.Lock()
+    ready = False
+
+    def _ensure_schema(sender, **extra):
+        nonlocal ready
+        if ready:
+            return
+        with lock:
+            if not ready:
+                db.create_all()
+                ready = True
+
+    appcontext_pushed.connect(_ensure_schema, app, weak=False)
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # SQLite の場合：複数ワーカーからの読み書きを並行させるため WAL を有効にし、外部キーを強制する
+    if type(dbapi_connection).__module__.startswith('sqlite3'):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+def _page(query, model, cursor, limit):
+    # 主キーの範囲条件で続きから取得する（OFFSET を使わないので後ろのページでも読み飛ばしが発生しない）
+    if cursor is not None:
+        query = query.where(model.id > cursor)
+    items = db.session.scalars(query.order_by(model.id).limit(limit + 1)).all()
+    if len(items) > limit:
+        return items[:limit], items[limit - 1].id
+    return items, None
+
+# 企画の内容（登録・編集・削除）だけで上がるバージョンの scope。投票では上がらないため、
+# 検索インデックスの作り直しの判定に使う（グループ名と衝突しないよう記号で始める）
+CONTENT_SCOPE = '#content'
+
+def _scope(group):
+    # グループ未設定（None）の企画もバージョン管理できるよう文字列に変換する
+    return group if group is not None else ''
+
+class SQLStore:
+    """SQLAlchemy（SQLite / PostgreSQL）にデータを保持するストア（複数ワーカー向け）"""
+
+    def __init__(self):
+        if not event.contains(Engine, 'connect', _sqlite_pragmas):
+            event.listen(Engine, 'connect', _sqlite_pragmas)
+        # 全文検索のインデックスはワーカーごとに持ち、どのバージョンのデータから作ったかを記録する
+        self._search_index = SearchIndex()
+        self._search_version = None
+        self._search_lock = threading.Lock()
+
+    # データは DB にあるため、メモリから捨てても失われない
+    persistent = True
+
+    def close(self):
+        pass
+
+    # --- 企画 ---
+
+    def all_proposals(self):
+        return db.session.scalars(select(Proposal).order_by(Proposal.id)).all()
+
+    def iter_proposals(self, batch_size=500):
+        # 一定件数ずつ取得しながら返す（エクスポート用）
+        query = select(Proposal).order_by(Proposal.id).execution_options(yield_per=batch_size)
+        return iter(db.session.scalars(query))
+
+    def get_proposal(self, proposal_id):
+        return db.session.get(Proposal, proposal_id)
+
+    def group_proposals(self, group, order='cost'):
+        """グループの企画を降順ソート済みで返す（絞り込み・並び替えはSQL側で行う）"""
+        query = select(Proposal).where(Proposal.creator_group == group).order_by(ORDER_BY[order], Proposal.id)
+        return db.session.scalars(query).all()
+
+    def page_proposals(self, cursor=None, limit=PAGE_SIZE, group=None, category=None):
+        """企画を ID 順に1ページ分返す（group・category で絞り込み可）。(ページ, 次の cursor) を返す"""
+        query = select(Proposal)
+        if group is not None:
+            query = query.where(Proposal.creator_group == group)
+        if category is not None:
+            query = query.where(Proposal.category == category)
+        return _page(query, Proposal, cursor, limit)
+
+    def is_creator(self, creator_id):
+        """企画を1件以上登録しているか"""
+        if creator_id is None: return False
+        query = select(Proposal.id).where(Proposal.creator_id == str(creator_id)).limit(1)
+        return db.session.scalar(query) is not None
+
+    def search(self, query, group=None, limit=20):
+        """企画を全文検索し、(企画, スコア) をスコアの高い順に返す（group 指定時はそのグループのみ）"""
+        with self._search_lock:
+            version = self.content_version()
+            if version != self._search_version:
+                # 他のワーカーの変更を含むため作り直す
+                index = SearchIndex()
+                for p in self.iter_proposals():
+                    index.add(p)
+                self._search_index, self._search_version = index, version
+            hits = self._search_index.search(query, group, limit)
+        proposals = {p.id: p for p in db.session.scalars(select(Proposal).where(Proposal.id.in_([pid for pid, _ in hits])))}
+        return [(proposals[pid], score) for pid, score in hits if pid in proposals]
+
+    def _update_search_index(self, apply):
+        # 直前のバージョンから自分の変更の分だけ進んでいれば差分更新する（それ以外は次回の検索で作り直す）
+        with self._search_lock:
+            version = self.content_version()
+            if self._search_version is not None and self._search_version == version - 1:
+                apply(self._search_index)
+                self._search_version = version
+
+    def add_proposal(self, creator_id, title, author, target, problem, details, effect, c1, c2, c3, category=None):
+        """企画を登録する。同じ作成者・同じタイトルの企画があれば None を返す"""
+        creator_id = str(creator_id) if creator_id is not None else None
+        exists = db.session.scalar(
+            select(Proposal.id).where(Proposal.creator_id == creator_id, Proposal.title == title).limit(1)
+        )
+        if exists is not None:
+            return None
+        new_proposal = Proposal(
+            title=title, author=author, target=target, category=category,
+            problem=problem, details=details, effect=effect,
+            cost_pt_1=max(0, safe_int(c1)), cost_pt_2=max(0, safe_int(c2)), cost_pt_3=max(0, safe_int(c3)),
+            creator_id=creator_id, creator_group=get_group_from_id(creator_id),
+        )
+        db.session.add(new_proposal)
+        try:
+            # 上の確認の後に別ワーカーが同じ企画を登録していれば、一意制約によりここで弾かれる
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return None
+        self._bump(new_proposal.creator_group, content=True)
+        db.session.commit()
+        self._update_search_index(lambda index: index.add(new_proposal))
+        return new_proposal
+
+    def import_proposals(self, rows):
+        """企画をまとめて登録する（rows は add_proposal の引数の dict）。(登録数, 重複数) を返す"""
+        rows = list(rows)
+        creators = {str(row['creator_id']) for row in rows}
+        # 既存の (作成者ID, タイトル) を1クエリで取得して重複を判定する
+        seen = {tuple(row) for row in db.session.execute(
+            select(Proposal.creator_id, Proposal.title).where(Proposal.creator_id.in_(creators))
+        )}
+        created = []
+        for row in rows:
+            key = (str(row['creator_id']), row['title'])
+            if key in seen:
+                continue
+            seen.add(key)
+            created.append(Proposal(
+                title=row['title'], author=row['author'], target=row['target'], category=row['category'],
+                problem=row['problem'], details=row['details'], effect=row['effect'],
+                cost_pt_1=max(0, safe_int(row['c1'])), cost_pt_2=max(0, safe_int(row['c2'])), cost_pt_3=max(0, safe_int(row['c3'])),
+                creator_id=key[0], creator_group=get_group_from_id(key[0]),
+            ))
+        if created:
+            db.session.add_all(created)
+            try:
+                db.session.flush()
+            except IntegrityError:
+                # 別ワーカーが同じ企画を同時に登録した：1件ずつ登録し直し、重複した分を除く
+                db.session.rollback()
+                created = self._insert_each(created)
+        if created:
+            self._bump(*{p.creator_group for p in created}, content=True)
+        db.session.commit()
+        if created:
+            def add_created(index):
+                for p in created:
+                    index.add(p)
+            self._update_search_index(add_created)
+        return len(created), len(rows) - len(created)
+
+    def _insert_each(self, proposals):
+        """企画を1件ずつセーブポイント内で登録し、一意制約に反しなかったものを返す"""
+        inserted = []
+        for p in proposals:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(p)
+            except IntegrityError:
+                continue
+            inserted.append(p)
+        return inserted
+
+    def update_proposal(self, p, c1, c2, c3, **fields):
+        """企画の内容とコストを更新する。企画が（別ワーカーで）削除されていれば何もせず False を返す"""
+        for name in PROPOSAL_FIELDS:
+            if name in fields:
+                setattr(p, name, fields[name])
+        p.cost_pt_1 = max(0, safe_int(c1))
+        p.cost_pt_2 = max(0, safe_int(c2))
+        p.cost_pt_3 = max(0, safe_int(c3))
+        try:
+            # 更新対象の行がなければ StaleDataError になる。変更がなく UPDATE されない場合は下で確認する
+            self._bump(p.creator_group, content=True)
+            db.session.flush()
+            exists = db.session.scalar(select(Proposal.id).where(Proposal.id == p.id))
+        except StaleDataError:
+            exists = None
+        if exists is None:
+            db.session.rollback()
+            return False
+        db.session.commit()
+        self._update_search_index(lambda index: index.add(p))
+        return True
+
+    def delete_proposal(self, p):
+        """企画を削除し、その企画への投票を取り除く"""
+        votes = db.session.execute(select(Vote.voter_id, Vote.points).where(Vote.proposal_id == p.id)).all()
+        for voter_id, points in votes:
+            ballot = db.session.get(Ballot, voter_id, with_for_update=True)
+            if ballot is None:
+                continue
+            ballot.total_points -= points
+            # ポイントが0より大きい投票が残っていない場合は未投票に戻す
+            if ballot.total_points <= 0:
+                db.session.delete(ballot)
+        db.session.execute(Vote.__table__.delete().where(Vote.proposal_id == p.id))
+        self._bump(p.creator_group, content=True)
+        proposal_id = p.id
+        db.session.delete(p)
+        db.session.commit()
+        self._update_search_index(lambda index: index.remove(proposal_id))
+
+    # --- バージョン ---
+
+    def data_version(self, group=ALL_GROUPS):
+        """データ（全体またはグループ単位）のバージョンを返す"""
+        version = db.session.scalar(select(DataVersion.version).where(DataVersion.scope == _scope(group)))
+        return version or 0
+
+    def content_version(self):
+        """企画の内容のバージョン（投票では変わらない）"""
+        version = db.session.scalar(select(DataVersion.version).where(DataVersion.scope == CONTENT_SCOPE))
+        return version or 0
+
+    def wait_for_change(self, group, version, timeout):
+        """グループのバージョンが version から変わるまで最大 timeout 秒待つ。変わったら True"""
+        deadline = time.monotonic() + timeout
+        while True:
+            # 待機中は接続をプールに返し、確認のたびに最新のコミットを読む
+            db.session.close()
+            if self.data_version(group) != version:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    def _bump(self, *groups, content=False):
+        # 変更と同じトランザクション内でバージョンを上げる（content: 企画の内容の変更）
+        scopes = {ALL_GROUPS, *map(_scope, groups)}
+        if content:
+            scopes.add(CONTENT_SCOPE)
+        for scope in scopes:
+            bumped = db.session.execute(
+                update(DataVersion).where(DataVersion.scope == scope).values(version=DataVersion.version + 1)
+            ).rowcount
+            if bumped:
+                continue
+            try:
+                with db.session.begin_nested():
+                    db.session.add(DataVersion(scope=scope, version=1))
+            except IntegrityError:
+                # 別ワーカーが同時に行を作成した場合
+                db.session.execute(
+                    update(DataVersion).where(DataVersion.scope == scope).values(version=DataVersion.version + 1)
+                )
+
+    # --- 投票 ---
+
+    def has_voted(self, voter_id):
+        if not voter_id: return False
+        return db.session.scalar(select(Ballot.voter_id).where(Ballot.voter_id == str(voter_id))) is not None
+
+    def get_ballot(self, voter_id):
+        """投票者の投票内容を返す（未投票なら None）"""
+        if not voter_id: return None
+        return db.session.get(Ballot, str(voter_id))
+
+    def all_ballots(self):
+        return db.session.scalars(select(Ballot)).all()
+
+    def iter_ballots(self, batch_size=500):
+        # 配分（votes）はバッチごとに1回の IN クエリでまとめて読む（投票ごとに読むと N+1 回になる）
+        query = (
+            select(Ballot).order_by(Ballot.submitted_at)
+            .options(selectinload(Ballot.votes))
+            .execution_options(yield_per=batch_size)
+        )
+        return iter(db.session.scalars(query))
+
+    def submit_ballot(self, voter_id, allocations):
+        """投票（proposal_id: points）を1トランザクションで確定する。確定できなければ None を返す"""
+        if sum(allocations.values()) != BALLOT_POINTS:
+            return None
+        voter_id = str(voter_id)
+        # 解析後に削除された企画が含まれていれば投票全体を無効にする
+        found = db.session.scalar(select(func.count(Proposal.id)).where(Proposal.id.in_(list(allocations))))
+        if found != len(allocations):
+            return None
+        groups = db.session.scalars(select(Proposal.creator_group).where(Proposal.id.in_(list(allocations))).distinct()).all()
+        ballot = Ballot(voter_id=voter_id, voter_group=get_group_from_id(voter_id), total_points=BALLOT_POINTS)
+        ballot.votes = [Vote(proposal_id=pid, points=pt) for pid, pt in allocations.items()]
+        db.session.add(ballot)
+        try:
+            # ballots の主キーにより、別ワーカー・別スレッドからの二重送信もここで弾かれる
+            # （後続のクエリの autoflush で例外が出ないよう、先に明示的に flush する）
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return None
+        self._bump(*groups)
+        db.session.commit()
+        return ballot
+
+    def verify_tallies(self, repair=False):
+        """投票者ごとの合計ポイントを votes から再集計して検算し、不一致の投票者IDを返す"""
+        sums = (
+            select(Vote.voter_id, func.sum(Vote.points).label('points'))
+            .group_by(Vote.voter_id)
+            .subquery()
+        )
+        rows = db.session.execute(
+            select(Ballot, func.coalesce(sums.c.points, 0))
+            .outerjoin(sums, sums.c.voter_id == Ballot.voter_id)
+            .where(func.coalesce(sums.c.points, 0) != Ballot.total_points)
+        ).all()
+        if repair and rows:
+            for ballot, points in rows:
+                ballot.total_points = points
+            self._bump(*(ballot.group for ballot, _ in rows))
+            db.session.commit()
+        return [ballot.voter_id for ballot, _ in rows]
+
+    # --- レポート ---
+
+    def all_reports(self):
+        return db.session.scalars(select(Feedback).order_by(Feedback.id)).all()
+
+    def iter_reports(self, batch_size=500):
+        # 一定件数ずつ取得しながら返す（エクスポート用）
+        query = select(Feedback).order_by(Feedback.id).execution_options(yield_per=batch_size)
+        return iter(db.session.scalars(query))
+
+    def get_report(self, report_id):
+        return db.session.get(Feedback, report_id)
+
+    def page_reports(self, cursor=None, limit=PAGE_SIZE, r_type=None, status=None):
+        """レポートを ID 順に1ページ分返す（種類・状態で絞り込み可）。(ページ, 次の cursor) を返す"""
+        query = select(Feedback)
+        if r_type is not None:
+            query = query.where(Feedback.type == r_type)
+        if status is not None:
+            query = query.where(Feedback.status == status)
+        return _page(query, Feedback, cursor, limit)
+
+    def add_report(self, r_type, env, details):
+        report = Feedback(type=r_type, env_id=env, details=details)
+        db.session.add(report)
+        db.session.commit()
+        return report
+
+    def archive_report(self, report_id):
+        target_r = db.session.get(Feedback, report_id)
+        if target_r:
+            target_r.status = 'archived'
+            db.session.commit()
+        return target_r
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import click
+from jinja2 import FileSystemBytecodeCache
+
+import metrics
+
+class StartupTimer:
+    """create_app() の段階ごとの所要時間（秒）を記録する"""
+
+    def __init__(self):
+        self.phases = {}
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    @property
+    def total(self):
+        return sum(seconds for name, seconds in self.phases.items() if name != 'first_request')
+
+    def summary(self):
+        parts = [f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.phases.items()]
+        return ' '.join(parts + [f"total={self.total * 1000:.1f}ms"])
+
+    def publish(self, app):
+        """内訳をログと計測値（un_design_startup_seconds）に出し、最初のリクエストの所要時間も記録する"""
+        app.extensions['un_design_startup'] = self
+        for name, seconds in self.phases.items():
+            metrics.registry.set('un_design_startup_seconds', seconds, phase=name)
+        app.logger.info("Startup: %s", self.summary())
+
+        # 最初のリクエストだけ WSGI の入口で計測する（アプリコンテキストの作成や遅延したスキーマ確認も含む）。
+        # 計測後は元の wsgi_app に戻すので、2回目以降のリクエストには影響しない
+        wsgi_app = app.wsgi_app
+        lock = threading.Lock()
+
+        def first_request_timer(environ, start_response):
+            start = time.perf_counter()
+            try:
+                return wsgi_app(environ, start_response)
+            finally:
+                with lock:
+                    if app.wsgi_app is first_request_timer:
+                        app.wsgi_app = wsgi_app
+                        seconds = time.perf_counter() - start
+                        self.add('first_request', seconds)
+                        metrics.registry.set('un_design_startup_seconds', seconds, phase='first_request')
+                        app.logger.info("First request served in %.1f ms", seconds * 1000)
+
+        app.wsgi_app = first_request_timer
+
+def compile_templates(app):
+    """全テンプレートを読み込んでコンパイルする（バイトコードキャッシュがあればそこにも書き出す）。件数を返す"""
+    env = app.jinja_env
+    names = env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+def init_templates(app):
+    """Jinja のバイトコードキャッシュ（UN_DESIGN_JINJA_CACHE）と起動時のコンパイル（UN_DESIGN_WARM_TEMPLATES）を設定する"""
+    cache_dir = app.config.get('UN_DESIGN_JINJA_CACHE')
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    if app.config.get('UN_DESIGN_WARM_TEMPLATES'):
+        compile_templates(app)
+
+    @app.cli.command('compile-templates')
+    def compile_templates_command():
+        """Compile all templates into the Jinja bytecode cache (run at build time)."""
+        if not cache_dir:
+            raise click.ClickException('UN_DESIGN_JINJA_CACHE is not set.')
+        click.echo(f'compiled {compile_templates(app)} templates into {cache_dir}')
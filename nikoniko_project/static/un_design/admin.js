@@ -0,0 +1,219 @@
+document.addEventListener("DOMContentLoaded", () => {
+    // ページ遷移アニメーション
+    document.querySelectorAll('a').forEach(link => {
+        link.addEventListener('click', e => {
+            const href = link.getAttribute('href');
+            if (href && !href.startsWith('#') && !href.startsWith('javascript') && link.target !== '_blank' && !href.includes('export_csv')) {
+                e.preventDefault();
+                document.body.style.opacity = '0';
+                setTimeout(() => window.location.href = href, 500);
+            }
+        });
+    });
+
+    // --- 要素の組み立て（サーバーからの文字列は textContent で入れる） ---
+    const el = (tag, props = {}, ...children) => {
+        const node = Object.assign(document.createElement(tag), props);
+        node.append(...children);
+        return node;
+    };
+
+    const reportCard = r => {
+        const card = el('div', { className: 'card' });
+        if (r.status === 'archived') card.style.opacity = '0.3';
+        const buttons = el('div', { className: 'btn-zone' });
+        if (r.status === 'unread') {
+            const archive = el('a', { href: r.archive_url, className: 'btn btn-archive', textContent: 'ARCHIVE' });
+            archive.addEventListener('click', async e => {
+                e.preventDefault();
+                const res = await fetch(r.archive_url, { headers: { Accept: 'application/json' } });
+                if (res.ok) card.replaceWith(reportCard(await res.json()));
+            });
+            buttons.append(archive);
+        }
+        card.append(
+            el('div', { className: 'card-head' },
+                el('span', { className: 'accent', textContent: `ENTRY #${r.id} | ${(r.type || '').toUpperCase()}` }),
+                el('span', { textContent: `ENV: ${r.env ?? ''}` })),
+            el('p', { className: 'report-details', textContent: r.details || '' }),
+            buttons);
+        return card;
+    };
+
+    const proposalCard = p => {
+        const remove = el('a', { href: p.delete_url, className: 'btn btn-delete', textContent: 'DELETE' });
+        remove.addEventListener('click', e => {
+            if (!confirm('記録を抹消します。よろしいですか？')) e.preventDefault();
+        });
+        return el('div', { className: 'card', id: `proposal-${p.id}` },
+            el('span', { className: 'proposal-title', textContent: p.title }),
+            el('div', { className: 'proposal-meta', textContent: `#${p.id} | ${p.group || '-'} | ${p.category || '-'} | Author: ${p.author || ''} | Score: ${p.total_points} / ${p.target_cost}` }),
+            el('p', { className: 'proposal-problem', textContent: `${p.problem}...` }),
+            el('div', { className: 'btn-zone' },
+                el('a', { href: p.edit_url, className: 'btn btn-edit', textContent: 'EDIT' }),
+                remove));
+    };
+
+    // --- 一覧のページ読み込み（next_cursor を使って続きを取得し、末尾が見えたら自動で読む） ---
+    const pager = (list, more, render, filters) => {
+        let cursor = null;
+        let generation = 0;
+        let loading = false;
+        const load = async () => {
+            if (loading) return;
+            loading = true;
+            const current = generation;
+            const params = new URLSearchParams({ limit: list.dataset.limit, ...filters() });
+            if (cursor !== null) params.set('cursor', cursor);
+            try {
+                const data = await (await fetch(`${list.dataset.url}?${params}`)).json();
+                if (current !== generation) return; // 読み込み中に絞り込みが変わった
+                list.append(...data.items.map(render));
+                if (!list.children.length) list.append(el('p', { className: 'empty', textContent: 'NO ENTRIES' }));
+                cursor = data.next_cursor;
+                more.hidden = cursor === null;
+            } finally {
+                if (current === generation) loading = false;
+            }
+        };
+        const reset = () => {
+            generation += 1;
+            cursor = null;
+            loading = false;
+            list.replaceChildren();
+            load();
+        };
+        more.addEventListener('click', load);
+        new IntersectionObserver(entries => {
+            if (entries[0].isIntersecting && !more.hidden) load();
+        }, { rootMargin: '400px' }).observe(more);
+        return { load, reset };
+    };
+
+    const reportType = document.getElementById('report-type');
+    const reportStatus = document.getElementById('report-status');
+    const reports = pager(document.getElementById('report-list'), document.getElementById('report-more'), reportCard,
+        () => ({ type: reportType.value, status: reportStatus.value }));
+    reportType.addEventListener('change', reports.reset);
+    reportStatus.addEventListener('change', reports.reset);
+    reports.load();
+
+    const proposalGroup = document.getElementById('proposal-group');
+    const proposalCategory = document.getElementById('proposal-category');
+    const proposals = pager(document.getElementById('proposal-list'), document.getElementById('proposal-more'), proposalCard,
+        () => ({ group: proposalGroup.value, category: proposalCategory.value.trim() }));
+    proposalGroup.addEventListener('change', proposals.reset);
+    proposalCategory.addEventListener('change', proposals.reset);
+    proposals.load();
+
+    // --- 企画の検索（入力が止まってから問い合わせる。結果を選ぶと企画を1件取得して表示） ---
+    const searchInput = document.getElementById('proposal-search');
+    const searchResults = document.getElementById('search-results');
+    const showProposal = async id => {
+        const res = await fetch(`${searchResults.dataset.detailUrl}/${id}`);
+        if (!res.ok) return;
+        searchResults.querySelector('.search-detail')?.remove();
+        searchResults.append(el('li', { className: 'search-detail' }, proposalCard(await res.json())));
+    };
+    let searchTimer = null;
+    searchInput.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(async () => {
+            const q = searchInput.value.trim();
+            searchResults.replaceChildren();
+            if (!q) return;
+            const res = await fetch(`${searchInput.dataset.url}?q=${encodeURIComponent(q)}`);
+            const data = await res.json();
+            if (searchInput.value.trim() !== q) return;
+            for (const r of data.results) {
+                const a = el('a', { href: `#proposal-${r.id}`, textContent: `#${r.id} ${r.title}` });
+                a.addEventListener('click', e => {
+                    e.preventDefault();
+                    showProposal(r.id);
+                });
+                searchResults.append(el('li', {}, a, el('span', { className: 'meta', textContent: `${r.group || '-'} | ${r.category || '-'}` })));
+            }
+            if (!data.results.length) searchResults.textContent = 'NO MATCH';
+        }, 150);
+    });
+
+    // --- 統計（見える位置までスクロールしたら集計値と Chart.js を読み込んで描画） ---
+    const statsZone = document.getElementById('stats-zone');
+    const loadScript = src => new Promise((resolve, reject) => {
+        document.head.append(el('script', { src, onload: resolve, onerror: reject }));
+    });
+    const fillCounts = (list, counts) => {
+        list.replaceChildren(...Object.entries(counts).map(([name, count]) => el('li', { textContent: `${name}: ${count}件` })));
+    };
+    const drawStats = async () => {
+        const [stats] = await Promise.all([
+            fetch(statsZone.dataset.url).then(res => res.json()),
+            window.Chart ? null : loadScript(statsZone.dataset.chartSrc),
+        ]);
+        fillCounts(document.getElementById('group-counts'), stats.posts_by_group);
+        fillCounts(document.getElementById('category-counts'), stats.posts_by_category);
+        document.getElementById('achievement-counts').textContent =
+            `達成: ${stats.achievement_status.achieved}件 / 未達成: ${stats.achievement_status.not_achieved}件`;
+        document.getElementById('category-options').replaceChildren(
+            ...Object.keys(stats.posts_by_category).map(name => el('option', { value: name })));
+
+        const chartOptions = {
+            plugins: { legend: { labels: { color: 'white' } } },
+            scales: { 
+                y: { ticks: { color: 'white' }, grid: { color: 'rgba(255,255,255,0.1)' } },
+                x: { ticks: { color: 'white' }, grid: { color: 'rgba(255,255,255,0.1)' } }
+            }
+        };
+
+        // グループごと
+        new Chart(document.getElementById('groupChart').getContext('2d'), {
+            type: 'bar',
+            data: {
+                labels: Object.keys(stats.posts_by_group),
+                datasets: [{
+                    label: '投稿数',
+                    data: Object.values(stats.posts_by_group),
+                    backgroundColor: 'rgba(230, 194, 94, 0.6)',
+                    borderColor: 'rgba(230, 194, 94, 1)',
+                    borderWidth: 1
+                }]
+            },
+            options: chartOptions
+        });
+
+        // カテゴリごと
+        new Chart(document.getElementById('categoryChart').getContext('2d'), {
+            type: 'bar',
+            data: {
+                labels: Object.keys(stats.posts_by_category),
+                datasets: [{
+                    label: '投稿数',
+                    data: Object.values(stats.posts_by_category),
+                    backgroundColor: 'rgba(0, 210, 255, 0.6)',
+                    borderColor: 'rgba(0, 210, 255, 1)',
+                    borderWidth: 1
+                }]
+            },
+            options: chartOptions
+        });
+
+        // 目標達成状況
+        new Chart(document.getElementById('achievementChart').getContext('2d'), {
+            type: 'doughnut',
+            data: {
+                labels: ['達成', '未達成'],
+                datasets: [{
+                    data: [stats.achievement_status.achieved, stats.achievement_status.not_achieved],
+                    backgroundColor: ['rgba(46, 204, 113, 0.7)', 'rgba(231, 76, 60, 0.7)']
+                }]
+            },
+            options: { plugins: { legend: { labels: { color: 'white' } } } }
+        });
+    };
+    const statsObserver = new IntersectionObserver(entries => {
+        if (!entries[0].isIntersecting) return;
+        statsObserver.disconnect();
+        drawStats();
+    }, { rootMargin: '200px' });
+    statsObserver.observe(statsZone);
+});
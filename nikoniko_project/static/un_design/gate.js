@@ -0,0 +1,60 @@
+function reveal() {
+    const reveals = document.querySelectorAll(".reveal");
+    const windowHeight = window.innerHeight;
+    reveals.forEach(element => {
+        const elementTop = element.getBoundingClientRect().top;
+        if (elementTop < windowHeight - 150) { element.classList.add("active"); }
+    });
+}
+window.addEventListener("scroll", reveal);
+window.addEventListener("DOMContentLoaded", reveal);
+
+document.addEventListener("DOMContentLoaded", () => {
+    document.querySelectorAll('form').forEach(form => {
+        form.addEventListener('submit', () => {
+            document.body.style.opacity = '0';
+        });
+    });
+
+    document.querySelectorAll('a').forEach(link => {
+        link.addEventListener('click', e => {
+            const href = link.getAttribute('href');
+            if (href && !href.startsWith('#') && !href.startsWith('javascript') && link.target !== '_blank') {
+                e.preventDefault();
+                document.body.style.opacity = '0';
+                setTimeout(() => window.location.href = href, 800);
+            }
+        });
+    });
+
+    // 背景パーティクルエフェクト
+    const canvas = document.getElementById('bg-canvas');
+    const ctx = canvas.getContext('2d');
+    let particles = [];
+
+    function resizeCanvas() { canvas.width = window.innerWidth; canvas.height = window.innerHeight; }
+    window.addEventListener('resize', resizeCanvas);
+    resizeCanvas();
+
+    class Particle {
+        constructor() {
+            this.x = Math.random() * canvas.width;
+            this.y = Math.random() * canvas.height;
+            this.size = Math.random() * 3.0 + 1.0; // 2倍に大きく
+            this.speedX = Math.random() * 0.4 - 0.2; // 遅く
+            this.speedY = Math.random() * 0.4 - 0.2; // 遅く
+            this.opacity = Math.random() * 0.3 + 0.1; // 薄く
+        }
+        update() {
+            this.x += this.speedX; this.y += this.speedY;
+            if (this.x < 0) this.x = canvas.width; if (this.x > canvas.width) this.x = 0;
+            if (this.y < 0) this.y = canvas.height; if (this.y > canvas.height) this.y = 0;
+        }
+        draw() {
+            ctx.fillStyle = `rgba(230, 194, 94, ${this.opacity})`; ctx.beginPath(); ctx.arc(this.x, this.y, this.size, 0, Math.PI * 2); ctx.fill();
+        }
+    }
+    for(let i=0; i<40; i++) particles.push(new Particle()); // 数を減らす
+    function animateParticles() { ctx.clearRect(0,0,canvas.width,canvas.height); particles.forEach(p=>{p.update();p.draw();}); requestAnimationFrame(animateParticles); }
+    animateParticles();
+});
@@ -0,0 +1,43 @@
+const fields = document.querySelectorAll('.pt-field');
+const remainDisplay = document.getElementById('remain-pts');
+const submitBtn = document.getElementById('submitBtn');
+const statusBar = document.getElementById('status-bar');
+
+function updatePoints() {
+    if (!fields.length) return;
+    let totalAllocated = 0;
+    fields.forEach(f => { totalAllocated += parseInt(f.value || 0); });
+    const remaining = 1000 - totalAllocated;
+    if (remainDisplay) remainDisplay.innerText = Math.max(0, remaining);
+
+    if (remaining === 0) {
+        submitBtn.classList.add('ready');
+        submitBtn.disabled = false;
+        submitBtn.innerText = "投票を確定する";
+        statusBar.style.background = "#2ecc71"; statusBar.style.color = "#000";
+    } else if (remaining < 0) {
+        submitBtn.classList.remove('ready');
+        submitBtn.disabled = true;
+        submitBtn.innerText = "1000ポイントを超えています";
+        statusBar.style.background = "#e74c3c"; statusBar.style.color = "#fff";
+    } else {
+        submitBtn.classList.remove('ready');
+        submitBtn.disabled = true;
+        submitBtn.innerText = `${remaining}PTを割り振ってください`;
+        statusBar.style.background = "rgba(255,255,255,0.95)"; statusBar.style.color = "#000";
+    }
+}
+fields.forEach(f => { f.addEventListener('input', updatePoints); });
+
+document.addEventListener("DOMContentLoaded", () => {
+    document.querySelectorAll('a').forEach(link => {
+        link.addEventListener('click', e => {
+            const href = link.getAttribute('href');
+            if (href && !href.startsWith('#') && !href.startsWith('javascript') && link.target !== '_blank') {
+                e.preventDefault();
+                document.body.style.opacity = '0';
+                setTimeout(() => window.location.href = href, 800);
+            }
+        });
+    });
+});
@@ -0,0 +1,48 @@
+import threading
+import weakref
+from collections import defaultdict
+
+# ストアごとの集計結果キャッシュ: store -> (data_version, dashboard)
+_cache = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+def compute_dashboard(proposals, ballots):
+    """管理画面の統計を、企画・投票者それぞれ1回の走査でまとめて計算する"""
+    posts_by_group = defaultdict(int)
+    posts_by_category = defaultdict(int)
+    achieved_count = 0
+    total = 0
+    for p in proposals:
+        total += 1
+        group = p.author_group
+        if group:
+            posts_by_group[group] += 1
+        if p.category:
+            posts_by_category[p.category] += 1
+        if p.has_achieved:
+            achieved_count += 1
+
+    # グループごとの投票数（投票者レジストリから集計）
+    votes_by_group = defaultdict(int)
+    for ballot in ballots:
+        if ballot.group:
+            votes_by_group[ballot.group] += ballot.total_points
+
+    return {
+        'posts_by_group': dict(posts_by_group),
+        'posts_by_category': dict(posts_by_category),
+        'votes_by_group': dict(votes_by_group),
+        'achievement_status': {'achieved': achieved_count, 'not_achieved': total - achieved_count},
+    }
+
+def get_dashboard(store):
+    """統計を返す。データが変わっていなければ前回の計算結果を使い回す"""
+    version = store.data_version()
+    with _cache_lock:
+        cached = _cache.get(store)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    dashboard = compute_dashboard(store.iter_proposals(), store.iter_ballots())
+    with _cache_lock:
+        _cache[store] = (version, dashboard)
+    return dashboard
@@ -0,0 +1,668 @@
+from flask import current_app
+from array import array
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from operator import attrgetter
+import logging
+import threading
+import time
+
+from roster import DIGITS, active_roster
+from search import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# 1人あたりの持ち点
+BALLOT_POINTS = 1000
+
+# データ全体のバージョンを表すキー（グループ単位のバージョンと区別する）
+ALL_GROUPS = '*'
+
+# 管理画面の一覧 API で1回に返す件数（既定値と上限）
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# 企画のうち、フォームから編集できる項目
+PROPOSAL_FIELDS = ('title', 'author', 'target', 'category', 'problem', 'details', 'effect')
+
+def safe_int(val):
+    try:
+        return int(val)
+    except (ValueError, TypeError):
+        return 0
+
+# --- ヘルパー関数 ---
+def get_group_from_id(voter_id):
+    # 名簿（roster.py、UN_DESIGN_ROSTER で設定）の対応表を引く
+    return active_roster().group_of(voter_id)
+
+def page_by_id(items, cursor=None, limit=PAGE_SIZE, match=None):
+    """ID 昇順のリストから、cursor（前のページの最後のID）より後の limit 件を返す
+
+    (ページ, 次のページの cursor) を返す。続きがなければ cursor は None。
+    開始位置は二分探索で求めるので、後ろのページでも先頭から数え直さない。
+    """
+    start = bisect_right(items, cursor, key=attrgetter('id')) if cursor is not None else 0
+    # items[start:] だと残り全件をコピーし、islice() だと先頭から start 件を読み飛ばすので、添字で走査する
+    rest = map(items.__getitem__, range(start, len(items)))
+    page = []
+    for item in rest if match is None else filter(match, rest):
+        if len(page) == limit:
+            return page, page[-1].id
+        page.append(item)
+    return page, None
+
+def voter_key(voter_id):
+    """投票者IDを内部キーに変換する（数字のIDは int、それ以外は文字列のまま）"""
+    if voter_id is None:
+        return None
+    if isinstance(voter_id, int):
+        return voter_id
+    voter_id = str(voter_id)
+    return int(voter_id) if DIGITS.fullmatch(voter_id) else voter_id
+
+# --- インメモリのデータモデル ---
+# ※UN_DESIGN_DATA_DIR を設定しない場合、サーバーを再起動するとリセットされます
+#   （設定すると変更ログとスナップショットから復元する。複数ワーカーで使う場合は UN_DESIGN_STORE=sql）
+
+class Proposal:
+    # 企画数が多くてもメモリを抑えるため、インスタンスごとの __dict__ を持たせない
+    __slots__ = (
+        'id', 'title', 'author', 'target', 'problem', 'details', 'effect',
+        'cost_pt_1', 'cost_pt_2', 'cost_pt_3', 'creator_id', 'group', 'category',
+        '_creator_key', '_total_points', '_achievement_ratio',
+    )
+
+    def __init__(self, id, title, author, target, problem, details, effect, c1, c2, c3, creator_id=None, category=None):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.target = target
+        self.problem = problem
+        self.details = details
+        self.effect = effect
+        self.cost_pt_1 = max(0, safe_int(c1))
+        self.cost_pt_2 = max(0, safe_int(c2))
+        self.cost_pt_3 = max(0, safe_int(c3))
+        self.creator_id = creator_id # 作成者のID
+        self._creator_key = voter_key(creator_id)
+        self.group = get_group_from_id(creator_id) # 作成者IDは変更されないため、グループは登録時に確定
+        self.category = category # 事業カテゴリ
+        # 集計値は投票・編集のたびに差分更新し、参照時は O(1) で返す
+        # （個々の投票は企画側には持たず、投票者レジストリの Ballot に保持する）
+        self._total_points = 0
+        self._achievement_ratio = 0.0
+
+    def is_own_vote(self, user_id):
+        return voter_key(user_id) == self._creator_key
+
+    def add_vote(self, user_id, points):
+        """投票を集計値に反映する"""
+        if not self.is_own_vote(user_id):
+            self._total_points += points
+            self._refresh_achievement()
+
+    def remove_vote(self, user_id, points):
+        """投票の取り消しを集計値に反映する"""
+        if not self.is_own_vote(user_id):
+            self._total_points -= points
+            self._refresh_achievement()
+
+    def set_costs(self, c1, c2, c3):
+        """コストを更新し、達成率を再計算する"""
+        self.cost_pt_1 = max(0, safe_int(c1))
+        self.cost_pt_2 = max(0, safe_int(c2))
+        self.cost_pt_3 = max(0, safe_int(c3))
+        self._refresh_achievement()
+
+    def _refresh_achievement(self):
+        target = self.target_cost
+        self._achievement_ratio = (self._total_points / target) if target > 0 else 0
+
+    def verify_tally(self, expected, repair=False):
+        """差分更新した集計値と、投票の全件走査で求めた値 expected が一致するか確認する"""
+        if expected == self._total_points:
+            return True
+        if repair:
+            self._total_points = expected
+            self._refresh_achievement()
+        return False
+
+    @property
+    def costs(self):
+        return [
+            ("設計・開発", self.cost_pt_1),
+            ("運用・維持", self.cost_pt_2),
+            ("精神的・肉体的", self.cost_pt_3)
+        ]
+
+    @property
+    def total_points(self):
+        # 登録者以外のユーザーによるポイントの合計（差分更新済みの値）
+        return self._total_points
+
+    @property
+    def achievement_ratio(self):
+        # 達成率（獲得ポイント / 目標コスト）
+        return self._achievement_ratio
+
+    @property
+    def has_achieved(self):
+        return self._total_points >= self.target_cost
+
+    @property
+    def target_cost(self):
+        # 達成条件：3つのコストの合計値
+        return self.cost_pt_1 + self.cost_pt_2 + self.cost_pt_3
+
+    @property
+    def author_group(self):
+        # プロジェクトのグループは、作成者のIDから決定する（登録時に算出済み）
+        return self.group
+
+class Report:
+    __slots__ = ('id', 'report_type', 'env_value', 'details', 'status')
+
+    def __init__(self, id, r_type, env, details):
+        self.id = id
+        self.report_type = r_type
+        self.env_value = env
+        self.details = details
+        self.status = 'unread' # unread, archived
+
+class Ballot:
+    """投票者1人分の投票内容
+
+    投票者×企画の行列のうち、この投票者の行を (企画ID, ポイント) の並列配列で持つ。
+    """
+    __slots__ = ('voter_id', 'group', 'proposal_ids', 'points', 'submitted_at', 'total_points')
+
+    def __init__(self, voter_id, allocations, submitted_at=None):
+        self.voter_id = voter_key(voter_id)
+        self.group = get_group_from_id(self.voter_id)
+        self.proposal_ids = array('I', allocations.keys())
+        self.points = array('I', allocations.values())
+        self.submitted_at = submitted_at if submitted_at is not None else time.time()
+        self.total_points = sum(self.points)
+
+    @property
+    def allocations(self):
+        # proposal_id: points
+        return dict(zip(self.proposal_ids, self.points))
+
+    def items(self):
+        return zip(self.proposal_ids, self.points)
+
+    def points_for(self, proposal_id):
+        try:
+            return self.points[self.proposal_ids.index(proposal_id)]
+        except ValueError:
+            return 0
+
+    def drop_proposal(self, proposal_id):
+        """削除された企画への配分を取り除き、取り除いたポイントを返す"""
+        try:
+            i = self.proposal_ids.index(proposal_id)
+        except ValueError:
+            return 0
+        del self.proposal_ids[i]
+        points = self.points.pop(i)
+        self.total_points -= points
+        return points
+
+# グループごとのソート済みビューの並び順
+SORT_KEYS = {
+    'cost': lambda p: p.target_cost,               # コスト合計値
+    'achievement': lambda p: p.achievement_ratio,  # 達成率
+}
+
+class MemoryStore:
+    """プロセス内メモリにデータを保持するストア（単一ワーカー向け）"""
+
+    def __init__(self):
+        self.proposals_db = []
+        self.reports_db = []
+        self.reports_by_id = {}
+        # 共有データ（企画リスト・インデックス・投票者レジストリ）を変更する処理はこのロック内で行う
+        # （gunicorn のスレッドワーカーで同時にリクエストを処理しても整合性を保つため）
+        self.lock = threading.RLock()
+        # --- グループ別インデックス ---
+        # 各クラスは自分のグループの企画しか見ないため、グループ単位で企画を保持しておく
+        self.proposals_by_id = {}
+        self.proposals_by_group = defaultdict(list)
+        # 作成者ID -> 企画数
+        self._creators = Counter()
+        # (作成者ID, タイトル) -> 企画数（二重送信チェック用のハッシュインデックス）
+        self._titles = Counter()
+        # 次に割り当てる企画ID（削除済みのIDは再利用しない）
+        self._next_id = 1
+        # グループごとのソート済みビュー: (group, order) -> list
+        self._sorted_views = {}
+        # --- 投票者レジストリ ---
+        # voter_key(voter_id) -> Ballot。投票済み判定・統計・「自分の投票」表示はここを直接参照する
+        self.voter_registry = {}
+        # データ変更のたびに増えるバージョン（ALL_GROUPS とグループごと）。キャッシュの無効化に使う
+        self._versions = defaultdict(int)
+        # バージョンが上がったことを待機中のスレッド（ライブ更新のストリーム）に知らせる
+        self._changed = threading.Condition()
+        # 変更ログ（persistence.Journal）。None なら永続化しない
+        self.journal = None
+        # 企画の全文検索用の転置インデックス（登録・編集・削除のたびに差分更新する）
+        self.search_index = SearchIndex()
+
+    def seed_samples(self):
+        """初期データ（サンプル）を登録する"""
+        self._insert_proposal(Proposal(1, "あえて階段しかない公園", "官公庁", "都市住民", "便利すぎて足腰が弱る", "エレベーターなし、階段のみの立体公園", "運動不足解消と頂上の達成感", 300, 200, 500, '1101', '建設・不動産業'))
+        self._insert_proposal(Proposal(2, "全自動ではない家電", "製造業の開発担当", "若者", "愛着がわかない", "手入れが必要なトースター", "道具への愛着と丁寧な暮らし", 200, 300, 100, '1201', '製造業（軽工業）'))
+        self._insert_report(Report(1, "bug", 1200, "ログイン画面の表示が崩れることがあります。"))
+        self._insert_report(Report(2, "idea", 1350, "わざとロード時間を長くして、期待感を煽るUIはどうでしょう？"))
+
+    # --- 企画 ---
+
+    def all_proposals(self):
+        with self.lock:
+            return list(self.proposals_db)
+
+    def iter_proposals(self):
+        # 呼び出し時点の一覧を順に返す（エクスポート用）
+        return iter(self.all_proposals())
+
+    def get_proposal(self, proposal_id):
+        return self.proposals_by_id.get(proposal_id)
+
+    def group_proposals(self, group, order='cost'):
+        """グループの企画を降順ソート済みで返す（変更があるまで結果を使い回す）"""
+        key = (group, order)
+        view = self._sorted_views.get(key)
+        if view is None:
+            with self.lock:
+                view = sorted(self.proposals_by_group.get(group, []), key=SORT_KEYS[order], reverse=True)
+                self._sorted_views[key] = view
+        return view
+
+    def page_proposals(self, cursor=None, limit=PAGE_SIZE, group=None, category=None):
+        """企画を ID 順に1ページ分返す（group・category で絞り込み可）。(ページ, 次の cursor) を返す"""
+        with self.lock:
+            items = self.proposals_db if group is None else self.proposals_by_group.get(group, [])
+            match = None if category is None else (lambda p: p.category == category)
+            return page_by_id(items, cursor, limit, match)
+
+    def is_creator(self, creator_id):
+        """企画を1件以上登録しているか"""
+        return self._creators[str(creator_id)] > 0
+
+    def search(self, query, group=None, limit=20):
+        """企画を全文検索し、(企画, スコア) をスコアの高い順に返す（group 指定時はそのグループのみ）"""
+        with self.lock:
+            hits = self.search_index.search(query, group, limit)
+            return [(self.proposals_by_id[pid], score) for pid, score in hits]
+
+    def add_proposal(self, creator_id, title, author, target, problem, details, effect, c1, c2, c3, category=None):
+        """企画を登録する。同じ作成者・同じタイトルの企画があれば None を返す"""
+        with self.lock:
+            # 二重送信防止：同じユーザーが同じタイトルの企画を持っていたらスキップ
+            if self._titles[(str(creator_id), title)]:
+                return None
+
+            new_proposal = Proposal(self._next_id, title, author, target, problem, details, effect, c1, c2, c3, creator_id, category)
+            self._insert_proposal(new_proposal)
+            if self.journal is not None:
+                self._log('add_proposals', proposals=[proposal_state(new_proposal)])
+            return new_proposal
+
+    def import_proposals(self, rows):
+        """企画をまとめて登録する（rows は add_proposal の引数の dict）。(登録数, 重複数) を返す"""
+        created = []
+        duplicates = 0
+        with self.lock:
+            for row in rows:
+                if self._titles[(str(row['creator_id']), row['title'])]:
+                    duplicates += 1
+                    continue
+                p = Proposal(
+                    self._next_id, row['title'], row['author'], row['target'], row['problem'], row['details'], row['effect'],
+                    row['c1'], row['c2'], row['c3'], row['creator_id'], row['category'],
+                )
+                self._insert_proposal(p)
+                created.append(p)
+            if created and self.journal is not None:
+                self._log('add_proposals', proposals=[proposal_state(p) for p in created])
+        return len(created), duplicates
+
+    def update_proposal(self, p, c1, c2, c3, **fields):
+        """企画の内容とコストを更新する。企画が（同時に）削除されていれば何もせず False を返す"""
+        with self.lock:
+            if self.proposals_by_id.get(p.id) is not p:
+                return False
+            self._titles[(str(p.creator_id), p.title)] -= 1
+            for name in PROPOSAL_FIELDS:
+                if name in fields:
+                    setattr(p, name, fields[name])
+            self._titles[(str(p.creator_id), p.title)] += 1
+            self.search_index.add(p)
+            p.set_costs(c1, c2, c3)
+            self.rescore([p.author_group])
+            self._bump(p.author_group)
+            if self.journal is not None:
+                self._log('update_proposal', proposal=proposal_state(p))
+            return True
+
+    def delete_proposal(self, p):
+        """企画を削除し、その企画への投票を取り除く"""
+        # リストを差し替えずにその場で削除する（インデックスとの整合を保つ）
+        with self.lock:
+            if self.proposals_by_id.get(p.id) is not p:
+                return
+            self.proposals_db.remove(p)
+            self.proposals_by_id.pop(p.id, None)
+            self._creators[str(p.creator_id)] -= 1
+            self._titles[(str(p.creator_id), p.title)] -= 1
+            self.search_index.remove(p.id)
+            group_list = self.proposals_by_group.get(p.author_group)
+            if group_list and p in group_list:
+                group_list.remove(p)
+            self._forget_proposal_votes(p)
+            self.rescore([p.author_group])
+            self._bump(p.author_group)
+            self._log('delete_proposal', id=p.id)
+
+    def _insert_proposal(self, p):
+        self.proposals_db.append(p)
+        self.proposals_by_id[p.id] = p
+        self._creators[str(p.creator_id)] += 1
+        self._titles[(str(p.creator_id), p.title)] += 1
+        self._next_id = max(self._next_id, p.id + 1)
+        self.search_index.add(p)
+        self.proposals_by_group[p.author_group].append(p)
+        self._invalidate_group_views(p.author_group)
+        self._bump(p.author_group)
+
+    def rescore(self, groups):
+        """グループの全企画の獲得ポイント・達成率を投票から1回の走査で再計算し、ソート済みビューを作り直す
+
+        管理者による編集・削除の直後にまとめて行い、表示のたびに計算し直さないようにする。
+        """
+        with self.lock:
+            for group in groups:
+                proposals = self.proposals_by_group.get(group, [])
+                index = {p.id: i for i, p in enumerate(proposals)}
+                totals = array('q', bytes(8 * len(proposals)))
+                for ballot in self.voter_registry.values():
+                    for pid, pt in ballot.items():
+                        i = index.get(pid)
+                        if i is not None and not proposals[i].is_own_vote(ballot.voter_id):
+                            totals[i] += pt
+                for p, total in zip(proposals, totals):
+                    p._total_points = total
+                    p._refresh_achievement()
+                for order, sort_key in SORT_KEYS.items():
+                    self._sorted_views[(group, order)] = sorted(proposals, key=sort_key, reverse=True)
+
+    def _invalidate_group_views(self, group, orders=None):
+        """グループのソート済みビューを破棄する（orders 未指定なら全種類）"""
+        for order in (orders or SORT_KEYS):
+            self._sorted_views.pop((group, order), None)
+
+    # --- バージョン ---
+
+    def data_version(self, group=ALL_GROUPS):
+        """データ（全体またはグループ単位）のバージョンを返す"""
+        return self._versions[group]
+
+    def wait_for_change(self, group, version, timeout):
+        """グループのバージョンが version から変わるまで最大 timeout 秒待つ。変わったら True"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self._versions[group] != version, timeout)
+
+    def _bump(self, *groups):
+        with self._changed:
+            self._versions[ALL_GROUPS] += 1
+            for group in set(groups):
+                self._versions[group] += 1
+            self._changed.notify_all()
+
+    # --- 投票 ---
+
+    def has_voted(self, voter_id):
+        return self.get_ballot(voter_id) is not None
+
+    def get_ballot(self, voter_id):
+        """投票者の投票内容を返す（未投票なら None）"""
+        if not voter_id: return None
+        return self.voter_registry.get(voter_key(voter_id))
+
+    def all_ballots(self):
+        with self.lock:
+            return list(self.voter_registry.values())
+
+    def iter_ballots(self):
+        return iter(self.all_ballots())
+
+    def submit_ballot(self, voter_id, allocations):
+        """投票（proposal_id: points）を all-or-nothing で確定する。確定できなければ None を返す"""
+        if sum(allocations.values()) != BALLOT_POINTS:
+            return None
+        with self.lock:
+            # 投票済み判定と登録を同じロック内で行い、二重送信を確実に弾く
+            if self.has_voted(voter_id):
+                return None
+            # 解析後に削除された企画が含まれていれば投票全体を無効にする
+            vote_updates = [(self.proposals_by_id.get(pid), pt) for pid, pt in allocations.items()]
+            if any(p is None for p, _ in vote_updates):
+                return None
+            ballot = Ballot(voter_id, allocations)
+            self._record_ballot(ballot, vote_updates)
+            if self.journal is not None:
+                self._log('ballot', ballot=ballot_state(ballot))
+        return ballot
+
+    def _record_ballot(self, ballot, vote_updates):
+        for p, pt in vote_updates:
+            p.add_vote(ballot.voter_id, pt)
+        # 全企画への反映が終わってから登録する（途中の状態を投票済みとみなさない）
+        self.voter_registry[ballot.voter_id] = ballot
+        # 達成率が変わったグループの達成率順ビューを破棄
+        touched = {p.author_group for p, _ in vote_updates}
+        for group in touched:
+            self._invalidate_group_views(group, ['achievement'])
+        self._bump(*touched)
+
+    def _forget_proposal_votes(self, p):
+        """削除される企画への投票をレジストリから取り除く（削除はまれなので全投票を走査する）"""
+        for uid, ballot in list(self.voter_registry.items()):
+            if not ballot.drop_proposal(p.id):
+                continue
+            # ポイントが0より大きい投票が残っていない場合は未投票に戻す
+            if ballot.total_points <= 0:
+                del self.voter_registry[uid]
+
+    def verify_tallies(self, repair=False):
+        """全投票を走査して集計値を検算し、不一致の企画IDを返す"""
+        with self.lock:
+            expected = Counter()
+            for ballot in self.voter_registry.values():
+                for pid, pt in ballot.items():
+                    p = self.proposals_by_id.get(pid)
+                    if p is not None and not p.is_own_vote(ballot.voter_id):
+                        expected[pid] += pt
+            mismatched = [p for p in self.proposals_db if not p.verify_tally(expected[p.id], repair=repair)]
+            if repair and mismatched:
+                # 直した集計値がキャッシュ済みのページ・ダッシュボードに反映されるようにする
+                self._bump(*(p.group for p in mismatched))
+            return [p.id for p in mismatched]
+
+    # --- レポート ---
+
+    def all_reports(self):
+        return list(self.reports_db)
+
+    def iter_reports(self):
+        # 呼び出し時点の一覧を順に返す（エクスポート用）
+        return iter(self.all_reports())
+
+    def get_report(self, report_id):
+        return self.reports_by_id.get(report_id)
+
+    def page_reports(self, cursor=None, limit=PAGE_SIZE, r_type=None, status=None):
+        """レポートを ID 順に1ページ分返す（種類・状態で絞り込み可）。(ページ, 次の cursor) を返す"""
+        def match(r):
+            return (r_type is None or r.report_type == r_type) and (status is None or r.status == status)
+        with self.lock:
+            return page_by_id(self.reports_db, cursor, limit, None if r_type is None and status is None else match)
+
+    def add_report(self, r_type, env, details):
+        with self.lock:
+            new_id = len(self.reports_db) + 1
+            report = Report(new_id, r_type, env, details)
+            self._insert_report(report)
+            if self.journal is not None:
+                self._log('add_report', report=report_state(report))
+            return report
+
+    def _insert_report(self, report):
+        self.reports_db.append(report)
+        self.reports_by_id[report.id] = report
+
+    def archive_report(self, report_id):
+        with self.lock:
+            target_r = self.reports_by_id.get(report_id)
+            if target_r:
+                target_r.status = 'archived'
+                self._log('archive_report', id=report_id)
+        return target_r
+
+    # --- 永続化（変更ログとスナップショット） ---
+
+    @property
+    def persistent(self):
+        """メモリから捨てても保存先から復元できるか"""
+        return self.journal is not None
+
+    def close(self):
+        """最新の状態をスナップショットに書き出し、変更ログを閉じる"""
+        with self.lock:
+            if self.journal is None:
+                return
+            self.journal.write_snapshot(self.export_state())
+            self.journal.close()
+            self.journal = None
+
+    def _log(self, op, **data):
+        # ロック内で呼ぶ（ログの順序と適用順序を一致させる）。
+        # 記録内容の変換にも時間がかかるため、呼び出し側で journal の有無を先に確認する
+        if self.journal is None:
+            return
+        self.journal.append(op, data)
+        if self.journal.snapshot_due():
+            # スナップショットはバックグラウンドで作る（ここではログのファイルを切り替えるだけ）
+            self.journal.start_compaction(type(self))
+
+    def export_state(self):
+        """全データを JSON に変換できる形で返す（集計値は投票から再計算できるので含めない）"""
+        with self.lock:
+            return {
+                'next_id': self._next_id,
+                'proposals': [proposal_state(p) for p in self.proposals_db],
+                'reports': [report_state(r) for r in self.reports_db],
+                'ballots': [ballot_state(b) for b in self.voter_registry.values()],
+            }
+
+    def load_state(self, state):
+        """export_state() の内容で空のストアを復元する"""
+        with self.lock:
+            for data in state['proposals']:
+                self._insert_proposal(proposal_from_state(data))
+            self._next_id = max(self._next_id, state['next_id'])
+            for data in state['reports']:
+                self._insert_report(report_from_state(data))
+            for data in state['ballots']:
+                self.apply('ballot', {'ballot': data})
+
+    def apply(self, op, data):
+        """変更ログの1件を適用する（起動時の再生用。ログへの再記録はしない）
+
+        存在しない企画への更新・削除・投票は、ログが途中で壊れていても起動できるよう、警告を出して読み飛ばす。
+        """
+        with self.lock:
+            if op == 'add_proposals':
+                for item in data['proposals']:
+                    self._insert_proposal(proposal_from_state(item))
+            elif op == 'update_proposal':
+                item = data['proposal']
+                p = self.proposals_by_id.get(item['id'])
+                if p is None:
+                    logger.warning("Skipped journal update for unknown proposal %s", item['id'])
+                    return
+                self.update_proposal(p, *item['costs'], **{name: item[name] for name in PROPOSAL_FIELDS})
+            elif op == 'delete_proposal':
+                p = self.proposals_by_id.get(data['id'])
+                if p is None:
+                    logger.warning("Skipped journal delete for unknown proposal %s", data['id'])
+                    return
+                self.delete_proposal(p)
+            elif op == 'ballot':
+                item = data['ballot']
+                allocations = {}
+                for pid, pt in dict(item['allocations']).items():
+                    if pid in self.proposals_by_id:
+                        allocations[pid] = pt
+                    else:
+                        logger.warning("Skipped journal vote by %s for unknown proposal %s", item['voter_id'], pid)
+                if not allocations:
+                    return
+                ballot = Ballot(item['voter_id'], allocations, item['submitted_at'])
+                self._record_ballot(ballot, [(self.proposals_by_id[pid], pt) for pid, pt in ballot.items()])
+            elif op == 'add_report':
+                self._insert_report(report_from_state(data['report']))
+            elif op == 'archive_report':
+                self.archive_report(data['id'])
+            else:
+                raise ValueError(f'unknown journal op: {op}')
+
+# --- 永続化用の変換（JSON に書き出せる dict との相互変換） ---
+
+def proposal_state(p):
+    data = {name: getattr(p, name) for name in PROPOSAL_FIELDS}
+    data.update(id=p.id, creator_id=p.creator_id, costs=[p.cost_pt_1, p.cost_pt_2, p.cost_pt_3])
+    return data
+
+def proposal_from_state(data):
+    return Proposal(
+        data['id'], data['title'], data['author'], data['target'], data['problem'], data['details'], data['effect'],
+        *data['costs'], data['creator_id'], data['category'],
+    )
+
+def report_state(r):
+    return {'id': r.id, 'type': r.report_type, 'env': r.env_value, 'details': r.details, 'status': r.status}
+
+def report_from_state(data):
+    report = Report(data['id'], data['type'], data['env'], data['details'])
+    report.status = data['status']
+    return report
+
+def ballot_state(b):
+    return {'voter_id': b.voter_id, 'allocations': [list(item) for item in b.items()], 'submitted_at': b.submitted_at}
+
+# --- ストアの選択 ---
+
+def create_store(app, data_dir=None, seed=True):
+    """設定（UN_DESIGN_STORE）に応じてストアを生成する
+
+    memory ストアは data_dir があればそこから復元して以降の変更を記録する。
+    seed が真なら、保存済みのデータがないときにサンプルの企画を登録する。
+    """
+    backend = app.config.get('UN_DESIGN_STORE', 'memory')
+    if backend == 'sql':
+        from sql_store import SQLStore
+        return SQLStore()
+    store = MemoryStore()
+    if data_dir:
+        from persistence import open_journal
+        open_journal(app, store, data_dir, seed=seed)
+    elif seed:
+        store.seed_samples()
+    return store
+
+def get_store():
+    """現在のイベント（リクエストの外では既定のイベント）のストアを返す"""
+    return current_app.extensions['un_design_events'].current().store
@@ -1,96 +1,18 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, make_response
-from collections import defaultdict
-import csv
-import io
+from flask import Blueprint, Response, abort, current_app, get_template_attribute, jsonify, render_template, request, redirect, url_for, session, stream_with_context
+
+from ballots import cast_ballot
+from events import current_event
+from exports import EXPORTS, iter_csv, iter_gzip
+from importer import format_for, import_proposals
+from live import group_snapshot, stream_group
+import metrics
+from page_cache import render_cached
+from stats import get_dashboard
+from store import MAX_PAGE_SIZE, PAGE_SIZE, safe_int, get_store
 
 # Blueprintの定義
 bp = Blueprint('un_design', __name__, url_prefix='/un_design')
 
-def safe_int(val):
-    try:
-        return int(val)
-    except (ValueError, TypeError):
-        return 0
-
-# --- ダミーデータモデル（データベースの代わり） ---
-# ※サーバーを再起動するとリセットされます
-
-class Proposal:
-    def __init__(self, id, title, author, target, problem, details, effect, c1, c2, c3, creator_id=None, category=None):
-        self.id = id
-        self.title = title
-        self.author = author
-        self.target = target
-        self.problem = problem
-        self.details = details
-        self.effect = effect
-        self.cost_pt_1 = max(0, safe_int(c1))
-        self.cost_pt_2 = max(0, safe_int(c2))
-        self.cost_pt_3 = max(0, safe_int(c3))
-        self.votes = {} # user_id: points
-        self.creator_id = creator_id # 作成者のID
-        self.category = category # 事業カテゴリ
-    
-    @property
-    def costs(self):
-        return [
-            ("設計・開発", self.cost_pt_1),
-            ("運用・維持", self.cost_pt_2),
-            ("精神的・肉体的", self.cost_pt_3)
-        ]
-
-    @property
-    def total_points(self):
-        # 登録者以外のユーザーによるポイントの合計
-        return sum(pt for uid, pt in self.votes.items() if str(uid) != str(self.creator_id))
-
-    @property
-    def target_cost(self):
-        # 達成条件：3つのコストの合計値
-        return self.cost_pt_1 + self.cost_pt_2 + self.cost_pt_3
-
-    @property
-    def author_group(self):
-        # プロジェクトのグループは、作成者のIDから決定する
-        return get_group_from_id(self.creator_id)
-class Report:
-    def __init__(self, id, r_type, env, details):
-        self.id = id
-        self.report_type = r_type
-        self.env_value = env
-        self.details = details
-        self.status = 'unread' # unread, archived
-
-# 初期データ（サンプル）
-proposals_db = [
-    Proposal(1, "あえて階段しかない公園", "官公庁", "都市住民", "便利すぎて足腰が弱る", "エレベーターなし、階段のみの立体公園", "運動不足解消と頂上の達成感", 300, 200, 500, '1101', '建設・不動産業'),
-    Proposal(2, "全自動ではない家電", "製造業の開発担当", "若者", "愛着がわかない", "手入れが必要なトースター", "道具への愛着と丁寧な暮らし", 200, 300, 100, '1201', '製造業（軽工業）')
-]
-reports_db = [
-    Report(1, "bug", 1200, "ログイン画面の表示が崩れることがあります。"),
-    Report(2, "idea", 1350, "わざとロード時間を長くして、期待感を煽るUIはどうでしょう？")
-]
-
-# 投票済み判定ヘルパー
-def has_user_voted(user_id):
-    if not user_id: return False
-    uid_str = str(user_id)
-    for p in proposals_db:
-        # キーが存在し、かつポイントが0より大きい場合のみ投票済みとみなす
-        if p.votes.get(uid_str, 0) > 0:
-            return True
-    return False
-
-# --- ヘルパー関数 ---
-def get_group_from_id(voter_id):
-    if not voter_id or not voter_id.isdigit(): return None
-    vid = int(voter_id)
-    if 1100 <= vid <= 1150: return "1組"
-    if 1200 <= vid <= 1250: return "2組"
-    if 1300 <= vid <= 1350: return "3組"
-    if 1400 <= vid <= 1450: return "4組"
-    return None
-
 # --- ルーティング ---
 
 @bp.route('/', methods=['GET', 'POST'])
@@ -102,30 +24,37 @@ def gate():
         password = request.form.get('password')
         voter_id = request.form.get('voter_id')
 
-        # パスワード設定（本来は環境変数などで管理）
-        ADMIN_PASSWORD = "930522"
-        USER_PASSWORD = "2525land"
+        # パスワードと名簿はイベントごとに設定する（events.py）
+        event = current_event()
 
-        print(f"Login Attempt: password='{password}', voter_id='{voter_id}'") # デバッグ用ログ
-
-        if password == ADMIN_PASSWORD:
+        if password == event.admin_password:
+            metrics.inc('un_design_login_attempts_total', result='admin')
+            session['event'] = event.slug
             session['is_admin'] = True
             session['voter_id'] = 'ADMIN'
             return redirect(url_for('un_design.admin_feedback'))
         
-        elif password == USER_PASSWORD:
-            # ID範囲チェック (1101-1440)
-            if voter_id and voter_id.isdigit() and 1101 <= int(voter_id) <= 1440:
+        elif password == event.user_password:
+            # 名簿にあるIDか確認し、同時にグループを決定する
+            group = event.roster.group_of(voter_id)
+            if group is not None:
+                metrics.inc('un_design_login_attempts_total', result='success')
+                session['event'] = event.slug
                 session['is_admin'] = False
                 session['voter_id'] = voter_id
-                session['group'] = get_group_from_id(voter_id)
+                session['group'] = group
                 return redirect(url_for('un_design.menu'))
             else:
-                error = "ID MUST BE BETWEEN 1101 AND 1440"
+                metrics.inc('un_design_login_attempts_total', result='invalid_id')
+                error = "ID IS NOT ON THE ROSTER"
         
         else:
+            metrics.inc('un_design_login_attempts_total', result='invalid_password')
             error = "ACCESS CODE IS INVALID"
 
+        # デバッグ用ログ（パスワードは記録しない）
+        current_app.logger.debug("Login attempt: voter_id=%r error=%r", voter_id, error)
+
     return render_template('un_design/gate.html', error=error)
 
 @bp.route('/menu')
@@ -145,13 +74,6 @@ def add():
         title = request.form.get('title')
         creator_id = session.get('voter_id')
 
-        # 二重送信防止：同じユーザーが同じタイトルの企画を持っていたらスキップ
-        if any(p.title == title and str(p.creator_id) == str(creator_id) for p in proposals_db):
-            return redirect(url_for('un_design.index'))
-
-        # ID生成：削除機能に対応するため、現在の最大ID+1を使用
-        new_id = (max(p.id for p in proposals_db) if proposals_db else 0) + 1
-
         # フォームからauthorを取得
         author = request.form.get('author')
         target = request.form.get('target')
@@ -163,10 +85,10 @@ def add():
         c2 = request.form.get('cost_pt_2')
         c3 = request.form.get('cost_pt_3')
 
-        new_proposal = Proposal(new_id, title, author, target, problem, details, effect, c1, c2, c3, creator_id, category)
-        new_proposal.votes = {} # 明示的に初期化
-        proposals_db.append(new_proposal)
-        
+        # 二重送信（同じユーザー・同じタイトル）の場合はストア側でスキップされる
+        if get_store().add_proposal(creator_id, title, author, target, problem, details, effect, c1, c2, c3, category):
+            metrics.inc('un_design_proposals_total')
+
         return redirect(url_for('un_design.index'))
 
     return render_template('un_design/add.html')
@@ -179,17 +101,41 @@ def index():
     
     current_user_id = session.get('voter_id')
     # セッションの記録ではなく、実データ（DB）の状態を正とする
-    has_voted = has_user_voted(current_user_id)
+    store = get_store()
+    has_voted = store.has_voted(current_user_id)
     session['has_voted'] = has_voted # セッション状態を実態に合わせて同期
     
-    # 自分のグループが作成した企画のみフィルタリング
+    # 自分のグループが作成した企画のみ（コスト合計値の降順）
+    # 同じグループ・同じ投票状態の生徒には同じ HTML を返し、作成者本人には自分の企画の操作欄だけ差し替える
     user_group = session.get('group')
-    filtered_proposals = [p for p in proposals_db if p.author_group == user_group]
-
-    # コスト合計値の降順でソート
-    sorted_proposals = sorted(filtered_proposals, key=lambda p: (p.cost_pt_1 + p.cost_pt_2 + p.cost_pt_3), reverse=True)
-    
-    return render_template('un_design/index.html', proposals=sorted_proposals, has_voted=has_voted)
+    errors = session.pop('ballot_errors', None)
+    owner = str(current_user_id) if store.is_creator(current_user_id) else None
+    if errors:
+        # 投票エラーの表示はキャッシュを通さない（まれな経路）
+        return render_template('un_design/index.html', proposals=store.group_proposals(user_group, 'cost'),
+                               has_voted=has_voted, owner=owner, ballot_errors=errors)
+    personalize = None
+    if owner is not None:
+        own = [p for p in store.group_proposals(user_group, 'cost') if str(p.creator_id) == owner]
+        personalize = lambda html: _own_proposal_actions(html, own, has_voted)
+    return render_cached(
+        store, 'un_design/index.html', (user_group, has_voted), store.data_version(user_group),
+        lambda: {'proposals': store.group_proposals(user_group, 'cost'), 'has_voted': has_voted, 'owner': None},
+        personalize=personalize, variant=owner,
+    )
+
+def _own_proposal_actions(html, proposals, has_voted):
+    """グループ共有の一覧の HTML で、自分の企画の操作欄（投票欄）を編集・削除のリンクに差し替える"""
+    actions = get_template_attribute('un_design/_proposal_actions.html', 'proposal_actions')
+    for p in proposals:
+        start = f'<!--actions:{p.id}-->'
+        end = f'<!--/actions:{p.id}-->'
+        i = html.find(start)
+        j = html.find(end, i)
+        if i < 0 or j < 0:
+            continue
+        html = f'{html[:i + len(start)]}\n{actions(p, True, has_voted)}\n                    {html[j:]}'
+    return html
 
 @bp.route('/vote_all', methods=['POST'])
 def vote_all():
@@ -201,31 +147,25 @@ def vote_all():
         return redirect(url_for('un_design.gate'))
     
     # 重複投票防止
-    if has_user_voted(current_user_id):
+    store = get_store()
+    if store.has_voted(current_user_id):
         return redirect(url_for('un_design.result'))
 
-    # 投票内容の一時保存と合計チェック
-    vote_updates = []
-    total_vote_points = 0
-
-    for p in proposals_db:
-        # 自分の企画には投票できない
-        if str(p.creator_id) == str(current_user_id):
-            continue
-            
-        points = request.form.get(f'points_{p.id}')
-        if points and user_group:
-            pt = safe_int(points)
-            if pt > 0:
-                vote_updates.append((p, pt))
-                total_vote_points += pt
-    
-    # ユーザーの持ち点（1000pt）を使い切っているか確認
-    if total_vote_points == 1000:
-        for p, pt in vote_updates:
-            p.votes[str(current_user_id)] = pt # キーを文字列に統一
-        session['has_voted'] = True
+    # 自分のグループの企画だけを対象に検証し、問題がなければロック内で一括確定
+    result = cast_ballot(store, current_user_id, user_group, request.form)
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    if not result.ok:
+        metrics.inc('un_design_ballot_errors_total', code=result.errors[0]['code'])
+        if wants_json:
+            return jsonify(result.as_dict()), 400
+        # エラーは企画一覧で1度だけ表示する
+        session['ballot_errors'] = result.errors
+        return redirect(url_for('un_design.index'))
 
+    metrics.inc('un_design_votes_total')
+    session['has_voted'] = True
+    if wants_json:
+        return jsonify(result.as_dict())
     return redirect(url_for('un_design.result'))
 
 @bp.route('/result')
@@ -235,17 +175,58 @@ def result():
         return redirect(url_for('un_design.gate'))
 
     user_group = session.get('group')
-    
-    # 自分のグループが作成した企画のみフィルタリング
-    group_proposals = [p for p in proposals_db if p.author_group == user_group]
-
-    # 達成率の降順でソート (ゼロ除算回避のため条件分岐)
-    group_proposals.sort(key=lambda p: (p.total_points / p.target_cost) if p.target_cost > 0 else 0, reverse=True)
-
-    # 達成済み企画があるかどうか
-    has_achieved = any(p.total_points >= p.target_cost for p in group_proposals)
+    store = get_store()
+
+    def build_context():
+        # 自分のグループが作成した企画のみ（達成率の降順）
+        group_proposals = store.group_proposals(user_group, 'achievement')
+        # 達成済み企画があるかどうか
+        has_achieved = any(p.has_achieved for p in group_proposals)
+        return {'proposals': group_proposals, 'has_achieved': has_achieved, 'version': version}
+
+    # 結果画面はグループ内で共通なので、データが変わるまで同じ HTML を使い回す
+    version = store.data_version(user_group)
+    return render_cached(store, 'un_design/result.html', (user_group,), version, build_context)
+
+@bp.route('/result/snapshot')
+def result_snapshot():
+    """統計結果の現在値（JSON）"""
+    if 'voter_id' not in session:
+        return jsonify({'error': 'unauthorized'}), 401
+    return jsonify(group_snapshot(get_store(), session.get('group')))
 
-    return render_template('un_design/result.html', proposals=group_proposals, has_achieved=has_achieved)
+@bp.route('/result/stream')
+def result_stream():
+    """統計結果の変化を server-sent events で配信する"""
+    if 'voter_id' not in session:
+        return jsonify({'error': 'unauthorized'}), 401
+
+    # 再接続時はブラウザが送る Last-Event-ID（＝最後に受け取ったバージョン）から再開する
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    since = safe_int(since) if since is not None else None
+    events = stream_group(get_store(), session.get('group'), since)
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # プロキシによるバッファリングを無効化
+    return response
+
+@bp.route('/search')
+def search():
+    """企画の全文検索（JSON）。生徒は自分のグループ、管理者は全グループが対象"""
+    if 'voter_id' not in session:
+        return jsonify(error='login required'), 401
+    query = request.args.get('q', '').strip()
+    limit = min(max(safe_int(request.args.get('limit', 20)), 1), 100)
+    group = None if session.get('is_admin') else session.get('group')
+    hits = get_store().search(query, group, limit) if query else []
+    return jsonify(query=query, results=[{
+        'id': p.id,
+        'title': p.title,
+        'category': p.category,
+        'group': p.author_group,
+        'problem': (p.problem or '')[:120],
+        'score': round(score, 3),
+    } for p, score in hits])
 
 @bp.route('/logout')
 def logout():
@@ -257,37 +238,169 @@ def logout():
 
 @bp.route('/admin/feedback')
 def admin_feedback():
-    """管理者用フィードバック画面"""
+    """管理者用フィードバック画面
+
+    レポート・企画・グラフはページ表示後に /admin/api/* から必要な分だけ読み込むため、
+    ここでは件数に依存しない枠だけを描画する。
+    """
     if not session.get('is_admin'):
         return redirect(url_for('un_design.gate'))
 
-    # --- 統計データの計算 ---
-    # グループごとの投稿数
-    posts_by_group = defaultdict(int)
-    for p in proposals_db:
-        if p.author_group:
-            posts_by_group[p.author_group] += 1
-
-    # カテゴリごとの投稿数
-    posts_by_category = defaultdict(int)
-    for p in proposals_db:
-        if p.category:
-            posts_by_category[p.category] += 1
-
-    # グループごとの投票数
-    votes_by_group = defaultdict(int)
-    for p in proposals_db:
-        for uid, points in p.votes.items():
-            grp = get_group_from_id(str(uid))
-            if grp:
-                votes_by_group[grp] += points
-
-    # 目標達成状況
-    achieved_count = sum(1 for p in proposals_db if p.total_points >= p.target_cost)
-    not_achieved_count = len(proposals_db) - achieved_count
-    achievement_status = {'achieved': achieved_count, 'not_achieved': not_achieved_count}
-
-    return render_template('un_design/feedback_admin.html', reports=reports_db, proposals=proposals_db, posts_by_group=posts_by_group, posts_by_category=posts_by_category, votes_by_group=votes_by_group, achievement_status=achievement_status)
+    # サーバー側セッションなら有効なセッションの一覧も表示する（Cookie セッションでは None）
+    backend = current_app.extensions.get('un_design_sessions')
+    sessions = _event_sessions(backend) if backend is not None else None
+
+    roster = current_event().roster
+
+    return render_template('un_design/feedback_admin.html', sessions=sessions, roster=roster, page_size=PAGE_SIZE)
+
+def _event_sessions(backend):
+    """このイベントでログインしたセッションだけを返す"""
+    events = current_app.extensions['un_design_events']
+    slug = events.current().slug
+    return [s for s in backend.sessions() if events.session_slug(s) == slug]
+
+# --- 管理画面用 JSON API（ID 順のカーソルページング） ---
+
+def _admin_api_denied():
+    if not session.get('is_admin'):
+        return jsonify(error='admin only'), 403
+    return None
+
+def _page_args():
+    """?cursor=（前のページの最後のID）と ?limit= を読む"""
+    cursor = request.args.get('cursor')
+    limit = min(max(safe_int(request.args.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    return (safe_int(cursor) if cursor else None), limit
+
+def report_json(r):
+    return {
+        'id': r.id,
+        'type': r.report_type,
+        'env': r.env_value,
+        'details': r.details,
+        'status': r.status,
+        'archive_url': url_for('un_design.archive_report', id=r.id),
+    }
+
+def proposal_json(p):
+    return {
+        'id': p.id,
+        'title': p.title,
+        'author': p.author,
+        'group': p.author_group,
+        'category': p.category,
+        'problem': (p.problem or '')[:120],
+        'total_points': p.total_points,
+        'target_cost': p.target_cost,
+        'edit_url': url_for('un_design.edit_proposal', id=p.id),
+        'delete_url': url_for('un_design.delete_proposal', id=p.id),
+    }
+
+@bp.route('/admin/api/reports')
+def api_reports():
+    """レポートの一覧（?type= / ?status= で絞り込み）"""
+    denied = _admin_api_denied()
+    if denied:
+        return denied
+    cursor, limit = _page_args()
+    items, next_cursor = get_store().page_reports(cursor, limit, request.args.get('type') or None, request.args.get('status') or None)
+    return jsonify(items=[report_json(r) for r in items], next_cursor=next_cursor)
+
+@bp.route('/admin/api/reports/<int:id>')
+def api_report(id):
+    denied = _admin_api_denied()
+    if denied:
+        return denied
+    report = get_store().get_report(id)
+    if report is None:
+        return jsonify(error='not found'), 404
+    return jsonify(report_json(report))
+
+@bp.route('/admin/api/proposals')
+def api_proposals():
+    """企画の一覧（?group= / ?category= で絞り込み）"""
+    denied = _admin_api_denied()
+    if denied:
+        return denied
+    cursor, limit = _page_args()
+    items, next_cursor = get_store().page_proposals(cursor, limit, request.args.get('group') or None, request.args.get('category') or None)
+    return jsonify(items=[proposal_json(p) for p in items], next_cursor=next_cursor)
+
+@bp.route('/admin/api/proposals/<int:id>')
+def api_proposal(id):
+    denied = _admin_api_denied()
+    if denied:
+        return denied
+    p = get_store().get_proposal(id)
+    if p is None:
+        return jsonify(error='not found'), 404
+    return jsonify(proposal_json(p))
+
+@bp.route('/admin/api/stats')
+def api_stats():
+    """グラフ用の集計値（データが変わるまでキャッシュを使う）"""
+    denied = _admin_api_denied()
+    if denied:
+        return denied
+    dashboard = get_dashboard(get_store())
+    return jsonify({name: dashboard[name] for name in ('posts_by_group', 'posts_by_category', 'votes_by_group', 'achievement_status')})
+
+@bp.route('/admin/api/tallies', methods=['GET', 'POST'])
+def api_tallies():
+    """集計値の検算。GET は不一致の一覧を返すだけ、POST は不一致を直す"""
+    denied = _admin_api_denied()
+    if denied:
+        return denied
+    repair = request.method == 'POST'
+    mismatched = get_store().verify_tallies(repair=repair)
+    if mismatched:
+        current_app.logger.warning("Tally mismatch (%s): %s", 'repaired' if repair else 'found', mismatched[:20])
+    return jsonify(mismatched=mismatched, repaired=repair and bool(mismatched))
+
+@bp.route('/admin/sessions/revoke', methods=['POST'])
+def revoke_session():
+    """セッションの強制ログアウト（管理者のみ）"""
+    if not session.get('is_admin'):
+        return redirect(url_for('un_design.gate'))
+    backend = current_app.extensions.get('un_design_sessions')
+    handle = request.form.get('handle', '')
+    if backend is not None and any(s['handle'] == handle for s in _event_sessions(backend)):
+        backend.revoke(handle)
+    return redirect(url_for('un_design.admin_feedback'))
+
+@bp.route('/admin/import', methods=['POST'])
+def admin_import():
+    """企画の一括取り込み（CSV / JSON / JSON Lines、管理者のみ）"""
+    if not session.get('is_admin'):
+        return redirect(url_for('un_design.gate'))
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify(error='file is required'), 400
+    fmt = request.form.get('format') or format_for(upload.filename)
+    try:
+        result = import_proposals(get_store(), upload.stream, fmt)
+    except ValueError as e:
+        # ヘッダー不足・JSON が配列でない・文字コード不正など（行ごとの構文エラーは errors に入る）
+        return jsonify(error=str(e)), 400
+    if result.created:
+        metrics.inc('un_design_proposals_total', result.created)
+    return jsonify(result.as_dict())
+
+@bp.route('/admin/metrics')
+def admin_metrics():
+    """計測値（Prometheus テキスト形式、管理者のみ）"""
+    if not session.get('is_admin'):
+        return redirect(url_for('un_design.gate'))
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/admin/profiles')
+def admin_profiles():
+    """遅いリクエストのプロファイル結果（UN_DESIGN_PROFILE=1 のときのみ記録、管理者のみ）"""
+    if not session.get('is_admin'):
+        return redirect(url_for('un_design.gate'))
+    profiles = current_app.extensions['un_design_profiles']
+    return Response(profiles.report() or 'no profiles recorded\n', mimetype='text/plain')
 
 @bp.route('/debug_report', methods=['POST'])
 def debug_report():
@@ -295,14 +408,14 @@ def debug_report():
     r_type = request.form.get('type')
     env = request.form.get('env')
     details = request.form.get('details')
-    new_id = len(reports_db) + 1
-    reports_db.append(Report(new_id, r_type, env, details))
+    get_store().add_report(r_type, env, details)
     return redirect(url_for('un_design.gate'))
 
 @bp.route('/edit_proposal/<int:id>', methods=['GET', 'POST'])
 def edit_proposal(id):
     """企画編集（管理者または作成者）"""
-    target_p = next((p for p in proposals_db if p.id == id), None)
+    store = get_store()
+    target_p = store.get_proposal(id)
     if not target_p: # 企画が見つからない場合
         return redirect(url_for('un_design.menu'))
 
@@ -314,17 +427,20 @@ def edit_proposal(id):
         return redirect(url_for('un_design.gate'))
 
     if request.method == 'POST':
-        target_p.title = request.form.get('title')
-        target_p.author = request.form.get('author')
-        target_p.target = request.form.get('target')
-        target_p.category = request.form.get('category')
-        target_p.problem = request.form.get('problem')
-        target_p.details = request.form.get('details')
-        target_p.effect = request.form.get('effect')
-        target_p.cost_pt_1 = max(0, safe_int(request.form.get('cost_pt_1')))
-        target_p.cost_pt_2 = max(0, safe_int(request.form.get('cost_pt_2')))
-        target_p.cost_pt_3 = max(0, safe_int(request.form.get('cost_pt_3')))
-        
+        updated = store.update_proposal(
+            target_p,
+            request.form.get('cost_pt_1'), request.form.get('cost_pt_2'), request.form.get('cost_pt_3'),
+            title=request.form.get('title'),
+            author=request.form.get('author'),
+            target=request.form.get('target'),
+            category=request.form.get('category'),
+            problem=request.form.get('problem'),
+            details=request.form.get('details'),
+            effect=request.form.get('effect'),
+        )
+        if not updated: # 編集中に削除された場合
+            abort(404)
+
         if is_admin:
             return redirect(url_for('un_design.admin_feedback'))
         else:
@@ -335,8 +451,8 @@ def edit_proposal(id):
 @bp.route('/delete_proposal/<int:id>')
 def delete_proposal(id):
     """企画削除（管理者または作成者本人）"""
-    global proposals_db
-    target_p = next((p for p in proposals_db if p.id == id), None)
+    store = get_store()
+    target_p = store.get_proposal(id)
     if not target_p:
         return redirect(url_for('un_design.index'))
 
@@ -347,7 +463,7 @@ def delete_proposal(id):
     if not is_admin and str(target_p.creator_id) != str(current_user_id):
         return redirect(url_for('un_design.gate'))
     
-    proposals_db = [p for p in proposals_db if p.id != id]
+    store.delete_proposal(target_p)
     
     if is_admin:
         return redirect(url_for('un_design.admin_feedback'))
@@ -360,39 +476,30 @@ def archive_report(id):
     if not session.get('is_admin'):
         return redirect(url_for('un_design.gate'))
     
-    target_r = next((r for r in reports_db if r.id == id), None)
-    if target_r:
-        target_r.status = 'archived'
+    report = get_store().archive_report(id)
+    if request.accept_mimetypes.best == 'application/json':
+        if report is None:
+            return jsonify(error='not found'), 404
+        return jsonify(report_json(report))
     return redirect(url_for('un_design.admin_feedback'))
 
 @bp.route('/export_csv/<target>')
 def export_csv(target):
-    """CSVエクスポート"""
+    """CSVエクスポート（?gzip=1 で gzip 圧縮版）"""
     if not session.get('is_admin'):
         return redirect(url_for('un_design.gate'))
 
-    si = io.StringIO()
-    writer = csv.writer(si)
-
-    if target == 'proposals':
-        filename = 'proposals.csv'
-        writer.writerow(['ID', 'Title', 'Author', 'Target', 'Category', 'Problem', 'Details', 'Effect', 'Cost_Dev', 'Cost_Ops', 'Cost_Health', 'Total_Points', 'Creator_ID'])
-        for p in proposals_db:
-            writer.writerow([
-                p.id, p.title, p.author, p.target, p.category, 
-                p.problem, p.details, p.effect, 
-                p.cost_pt_1, p.cost_pt_2, p.cost_pt_3, 
-                p.total_points, p.creator_id
-            ])
-    elif target == 'reports':
-        filename = 'reports.csv'
-        writer.writerow(['ID', 'Type', 'Env', 'Details', 'Status'])
-        for r in reports_db:
-            writer.writerow([r.id, r.report_type, r.env_value, r.details, r.status])
-    else:
+    row_source = EXPORTS.get(target)
+    if row_source is None:
         return redirect(url_for('un_design.admin_feedback'))
 
-    output = make_response(si.getvalue())
+    # 全体をメモリに溜めず、チャンク単位で送り出す
+    chunks = iter_csv(row_source(get_store()))
+    if request.args.get('gzip'):
+        filename = f'{target}.csv.gz'
+        output = Response(stream_with_context(iter_gzip(chunks)), mimetype='application/gzip')
+    else:
+        filename = f'{target}.csv'
+        output = Response(stream_with_context(chunks), mimetype='text/csv')
     output.headers["Content-Disposition"] = f"attachment; filename={filename}"
-    output.headers["Content-type"] = "text/csv"
-    return output
\ No newline at end of file
+    return output